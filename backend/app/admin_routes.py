@@ -1,51 +1,160 @@
+import hashlib
+import hmac
 import os
+import time
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, Header, Query, Response
-from fastapi.responses import JSONResponse
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
 from services.cron_service import reconcile_damaged_inventory
-from services.supabase_client import get_client
+from services.supabase_client import SUPABASE_SEM, get_client
 from services.damaged_inventory_repo import list_view
 from services import product_service
 from .schemas import DuplicateCheckRequest, BulkCreateRequest, BulkCreateResult, BulkCreateConfirmRequest
-from services.creation_log_service import log_creation_event
+from services.creation_log_service import fetch_creation_log, log_creation_event
 import logging
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/admin", tags=["Admin"])
 ADMIN_API_TOKEN = os.getenv("VITE_DBS_ADMIN_TOKEN")
+_ADMIN_TOKEN_BYTES = (ADMIN_API_TOKEN or "").encode()
+GATEWAY_LOGS_URL = os.getenv("GATEWAY_LOGS_URL", "")
+
+# /admin/logs and /admin/docs never change at runtime — serialize their
+# bodies once at import instead of per request.
+_LOGS_BODY = orjson.dumps({"gateway_logs_url": GATEWAY_LOGS_URL})
+_DOCS_BODY = orjson.dumps(
+    {
+        "links": [
+            {"title": "Damaged book policy", "url": "https://…"},
+            {"title": "Admin guide", "url": "https://…"},
+        ]
+    }
+)
 
 
 def require_admin_token(x_admin_token: str = Header(default="")):
-    if not ADMIN_API_TOKEN or x_admin_token != ADMIN_API_TOKEN:
+    if not _ADMIN_TOKEN_BYTES or not hmac.compare_digest(
+        x_admin_token.encode(), _ADMIN_TOKEN_BYTES
+    ):
         raise HTTPException(status_code=403, detail="Forbidden")
     return True
 
 
+# Token check applies to every /admin/* route, so attach it once at the
+# router level instead of repeating ok=Depends(...) per endpoint.
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    dependencies=[Depends(require_admin_token)],
+)
+
+# Short-TTL cache for the polled admin list endpoints. The Dashboard
+# refreshes these every few seconds; exact freshness within the TTL is not
+# required, so unchanged polls become dict lookups (and 304s via ETag).
+_LIST_CACHE_TTL_SECONDS = 5.0
+_list_cache: dict[tuple, tuple[float, str, dict]] = {}
+
+
+def _cached_list_response(key: tuple, payload: dict | None = None):
+    """
+    Return (etag, payload) for a cache key, storing `payload` when provided.
+    Returns None on a cache miss.
+    """
+    now = time.monotonic()
+    if payload is not None:
+        etag = hashlib.blake2b(orjson.dumps(payload), digest_size=16).hexdigest()
+        # Sweep dead entries while writing: keyset paging mints a new
+        # `after` key per page, so without eviction every cursor walked
+        # would pin its payload (up to 2000 rows) until the next manual
+        # reconcile clear.
+        for k in [k for k, v in _list_cache.items() if v[0] <= now]:
+            del _list_cache[k]
+        _list_cache[key] = (now + _LIST_CACHE_TTL_SECONDS, etag, payload)
+        return etag, payload
+
+    cached = _list_cache.get(key)
+    if cached and cached[0] > now:
+        return cached[1], cached[2]
+    return None
+
+
+def _conditional_response(request: Request, response: Response, etag: str, payload: dict):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "max-age=5"
+    if request.headers.get("if-none-match") == etag:
+        return Response(
+            status_code=304,
+            headers={"ETag": etag, "Cache-Control": "max-age=5"},
+        )
+    return payload
+
+
 class BulkDuplicateCheckRequest(BaseModel):
     entries: list[DuplicateCheckRequest]
 
 
 @router.get("/damaged-inventory")
-def list_damaged_inventory(
+async def list_damaged_inventory(
+    request: Request,
     response: Response,
-    ok=Depends(require_admin_token),
     limit: int = Query(200, ge=1, le=2000),
     in_stock: bool | None = Query(None),
+    after: int | None = Query(None, description="Cursor: last inventory_item_id of the previous page"),
 ):
-    resp = list_view(limit=limit, in_stock=in_stock)
-    data = resp.data or []
-    count = len(data)
-    logger.info(f"[Admin] /admin/damaged-inventory -> {count} rows (limit={limit}, in_stock={in_stock})")
-    response.headers["X-Result-Count"] = str(count)
-    return {"data": data, "meta": {"count": count}}
+    key = ("damaged-inventory", limit, in_stock, after)
+    cached = _cached_list_response(key)
+    if cached is None:
+        # list_view uses the sync Supabase client — keep it off the event loop.
+        async with SUPABASE_SEM:
+            resp = await run_in_threadpool(list_view, limit=limit, in_stock=in_stock, after=after)
+        data = resp.data or []
+        # PostgREST reports the total matching rows (count="exact") even
+        # though the payload is limit-sized.
+        count = resp.count if resp.count is not None else len(data)
+        # A full page means there may be more rows; the Dashboard passes the
+        # cursor back as ?after= instead of requesting one huge page.
+        next_cursor = data[-1]["inventory_item_id"] if len(data) == limit else None
+        logger.info(
+            "[Admin] /admin/damaged-inventory -> %s rows (limit=%s, in_stock=%s, after=%s)",
+            count,
+            limit,
+            in_stock,
+            after,
+        )
+        cached = _cached_list_response(
+            key, {"data": data, "meta": {"count": count, "next_cursor": next_cursor}}
+        )
+
+    etag, payload = cached
+    count = payload["meta"]["count"]
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "max-age=5",
+        "X-Result-Count": str(count),
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    # Stream the body in row-sized chunks rather than serializing up to
+    # 2000 rows in one buffer — lower peak memory, faster first byte.
+    async def _gen():
+        yield b'{"data":['
+        first = True
+        for row in payload["data"]:
+            yield orjson.dumps(row) if first else b"," + orjson.dumps(row)
+            first = False
+        yield b'],"meta":' + orjson.dumps(payload["meta"]) + b"}"
+
+    return StreamingResponse(_gen(), media_type="application/json", headers=headers)
 
 
 @router.post("/check-duplicate")
 async def check_duplicate(
     payload: DuplicateCheckRequest,
-    ok: bool = Depends(require_admin_token),
 ):
     """
     Bulk Creation Wizard duplicate checker.
@@ -62,32 +171,61 @@ async def check_duplicate(
         result.get("status"),
     )
 
-    return JSONResponse(result)
+    return ORJSONResponse(result)
 
 
 @router.post("/bulk-preview")
 async def bulk_preview(
     payload: BulkDuplicateCheckRequest,
-    ok: bool = Depends(require_admin_token),
+    stream: bool = Query(False, description="Stream results as NDJSON lines"),
 ):
     """
     Bulk Creation Wizard — preflight scan (read-only).
+
+    The whole batch is resolved in two round trips (one Shopify search, one
+    Supabase query) by check_damaged_duplicate_bulk. Duplicate handles
+    within the batch (common with spreadsheet paste) are checked once and
+    the result fanned back out to each entry position.
+
+    With ?stream=true the results come back as newline-delimited JSON, one
+    entry per line, so the Dashboard can render rows as they arrive instead
+    of waiting for the full array.
     """
-    results = []
-    for entry in payload.entries:
-        result = await product_service.check_damaged_duplicate(
-            canonical_handle=entry.canonical_handle,
+    unique_handles = list({entry.canonical_handle for entry in payload.entries})
+    try:
+        by_handle = await product_service.check_damaged_duplicate_bulk(unique_handles)
+    except Exception as e:
+        logger.warning("[Admin] bulk-preview batch check failed: %s", e)
+        by_handle = {}
+
+    results = [
+        by_handle.get(
+            entry.canonical_handle,
+            {
+                "status": "error",
+                "canonical_handle": entry.canonical_handle,
+                "error": "duplicate check failed",
+                "safe_to_create": False,
+            },
         )
-        results.append(result)
+        for entry in payload.entries
+    ]
 
     logger.info("[Admin] /admin/bulk-preview scanned=%s", len(results))
-    return JSONResponse({"results": results})
+
+    if stream:
+        async def _lines():
+            for result in results:
+                yield orjson.dumps(result) + b"\n"
+
+        return StreamingResponse(_lines(), media_type="application/x-ndjson")
+
+    return ORJSONResponse({"results": results})
 
 
 @router.post("/bulk-create/preview")
 async def bulk_create_preview(
     payload: BulkCreateRequest,
-    ok: bool = Depends(require_admin_token),
 ):
     """
     Damaged Books Service — Bulk Create PREVIEW ONLY.
@@ -132,7 +270,7 @@ async def bulk_create_preview(
         raise HTTPException(status_code=500, detail="Failed to build preview")
 
     logger.info("[Admin] /admin/bulk-create/preview rows=%s", len(preview_rows))
-    return JSONResponse({
+    return ORJSONResponse({
         "ok": True,
         "preview": preview_rows,
         "meta": {"count": len(preview_rows)},
@@ -142,7 +280,6 @@ async def bulk_create_preview(
 @router.post("/bulk-create")
 async def bulk_create(
     payload: BulkCreateConfirmRequest,
-    ok: bool = Depends(require_admin_token),
 ):
     """
     Damaged Books Service — Bulk Create CONFIRM.
@@ -179,13 +316,12 @@ async def bulk_create(
         logger.exception("[Admin] /admin/bulk-create failed")
         raise HTTPException(status_code=500, detail=str(e))
 
-    return JSONResponse(result)
+    return ORJSONResponse(result)
 
 
 @router.get("/product-details/{product_id}")
 async def get_product_details(
     product_id: str,
-    ok: bool = Depends(require_admin_token),
 ):
     """
     Fetch live Shopify data for the DamagedBooksTable sidebar.
@@ -203,62 +339,80 @@ async def get_product_details(
         logger.exception("[Admin] /admin/product-details/%s failed", product_id)
         raise HTTPException(status_code=500, detail=str(e))
 
-    return JSONResponse(details)
+    return ORJSONResponse(details)
 
 
 @router.get("/creation-log")
 async def get_creation_log(
-    ok=Depends(require_admin_token),
+    request: Request,
+    response: Response,
     limit: int = Query(100, ge=1, le=500),
 ):
-    from services.creation_log_service import fetch_creation_log
-    try:
-        rows = await fetch_creation_log(limit=limit)
-    except Exception as e:
-        logger.warning(f"[Admin] /admin/creation-log failed: {e}")
-        raise HTTPException(status_code=500, detail="Failed to fetch creation log")
-    return {"data": rows, "meta": {"count": len(rows)}}
+    key = ("creation-log", limit)
+    cached = _cached_list_response(key)
+    if cached is None:
+        try:
+            rows = await fetch_creation_log(limit=limit)
+        except Exception as e:
+            logger.warning(f"[Admin] /admin/creation-log failed: {e}")
+            raise HTTPException(status_code=500, detail="Failed to fetch creation log")
+        cached = _cached_list_response(key, {"data": rows, "meta": {"count": len(rows)}})
+
+    etag, payload = cached
+    return _conditional_response(request, response, etag, payload)
 
 
 @router.post("/reconcile")
-async def trigger_reconcile(ok=Depends(require_admin_token)):
+async def trigger_reconcile():
     result = await reconcile_damaged_inventory()
-    logger.info(f"[Admin] reconcile raw result: {result}")
+    # Reconcile rewrites inventory rows — drop cached list pages so the
+    # Dashboard's next poll reflects the fresh state instead of the TTL.
+    _list_cache.clear()
+    logger.debug("[Admin] reconcile raw result: %s", result)
     inspected = result.get("inspected", 0)
     updated = result.get("updated", 0)
     skipped = result.get("skipped", 0)
-    logger.info(f"[Admin] reconcile invoked -> inspected={inspected} updated={updated} skipped={skipped}")
-    return JSONResponse(result)
+    logger.info(
+        "[Admin] reconcile invoked -> inspected=%s updated=%s skipped=%s",
+        inspected,
+        updated,
+        skipped,
+    )
+    return ORJSONResponse(result)
 
 
 @router.get("/reconcile/status")
-def get_reconcile_status(ok=Depends(require_admin_token)):
+async def get_reconcile_status():
+    # Reconcile runs every 30 minutes; 5s staleness on the status poll
+    # is invisible to the Dashboard.
+    cached = _cached_list_response(("reconcile-status",))
+    if cached is not None:
+        return cached[1]
+
     supabase = get_client()
-    res = (
-        supabase.schema("damaged")
-        .from_("reconcile_log")
-        .select("inspected, updated, skipped, note, at")
-        .order("at", desc=True)
-        .limit(1)
-        .execute()
-    )
-    data = res.data[0] if res.data else None
-    if not data:
-        return {"last_run": None}
+
+    def _latest_log():
+        return (
+            supabase.schema("damaged")
+            .from_("reconcile_log")
+            .select("inspected, updated, skipped, note, at")
+            .order("at", desc=True)
+            .limit(1)
+            .execute()
+        )
+
+    async with SUPABASE_SEM:
+        res = await run_in_threadpool(_latest_log)
+    data = res.data[0] if res.data else {"last_run": None}
+    _cached_list_response(("reconcile-status",), data)
     return data
 
 
 @router.get("/logs")
-async def logs_link(ok=Depends(require_admin_token)):
-    url = os.getenv("GATEWAY_LOGS_URL", "")
-    return {"gateway_logs_url": url}
+async def logs_link():
+    return Response(content=_LOGS_BODY, media_type="application/json")
 
 
 @router.get("/docs")
-async def docs(ok=Depends(require_admin_token)):
-    return {
-        "links": [
-            {"title": "Damaged book policy", "url": "https://…"},
-            {"title": "Admin guide", "url": "https://…"},
-        ]
-    }
\ No newline at end of file
+async def docs():
+    return Response(content=_DOCS_BODY, media_type="application/json")
\ No newline at end of file
@@ -1,22 +1,51 @@
 # backend/app/main.py
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from .routes import router as app_router
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from .admin_routes import router as admin_router
+from services.shopify_client import shopify_client
+from services import creation_log_service, cron_service
 
 import logging
-logging.basicConfig(level=logging.INFO)
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+# Route log records through a queue so handlers only enqueue on the request
+# path; the listener thread does the actual stderr writes.
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_log_listener = QueueListener(_log_queue, logging.StreamHandler(), respect_handler_level=True)
+logging.basicConfig(level=logging.INFO, handlers=[QueueHandler(_log_queue)])
+_log_listener.start()
 
 # Import routers
 from api import system
 # Future imports: webhook, products, redirects, status, etc.
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # shopify_client lazily opens a pooled httpx.AsyncClient on first use;
+    # close it cleanly when the app shuts down.
+    yield
+    # Let fire-and-forget writes (reconcile_log, creation_log) land before teardown.
+    await cron_service.drain_background()
+    await creation_log_service.drain_background()
+    await shopify_client.aclose()
+    _log_listener.stop()
+
+
 app = FastAPI(
     title="Damaged Books Automation API",
     description="API for managing damaged book inventory and redirects",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # orjson serializes the large inventory/preview payloads several times
+    # faster than the stdlib encoder.
+    default_response_class=ORJSONResponse,
 )
 
 # Allow the Admin Dashboard to fetch /admin/*
@@ -25,10 +54,12 @@ ALLOWED_ORIGINS = [
     "https://www.kitchenartsandletters.com",
 ]
 
-# CORS (adjust origins as needed)
+# CORS — explicit origins let the middleware use a plain set-membership
+# check instead of reflecting the Origin header on every request (the "*"
+# + credentials combination forces the reflective path).
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Update to specific frontend domains in production
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
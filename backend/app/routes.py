@@ -6,8 +6,11 @@ import hmac
 import hashlib
 import base64
 import os
+import orjson
 from services import used_book_manager
 from services import redirect_service
+from services import cron_service
+from services.product_service import set_product_publish_status
 from pydantic import BaseModel
 import logging
 from config import get_settings
@@ -28,36 +31,67 @@ class RedirectRequest(BaseModel):
     to_path: str
 
 
-def verify_shopify_hmac(hmac_header: str, body: bytes, secret: str) -> bool:
+# Encoded once — verify_shopify_hmac runs on every webhook delivery.
+_WEBHOOK_SECRET_BYTES = (settings.SHOPIFY_WEBHOOK_SECRET or "").encode("utf-8")
+
+
+def verify_shopify_hmac(hmac_header: str, body: bytes) -> bool:
     """Verify HMAC signature from Shopify webhook."""
-    digest = hmac.new(
-        key=secret.encode('utf-8'),
-        msg=body,
-        digestmod=hashlib.sha256
-    ).digest()
-    computed_hmac = base64.b64encode(digest).decode()
-    return hmac.compare_digest(computed_hmac, hmac_header)
+    # One-shot hmac.digest takes the OpenSSL fast path; comparing raw bytes
+    # skips a b64encode+decode round trip per request.
+    digest = hmac.digest(_WEBHOOK_SECRET_BYTES, body, hashlib.sha256)
+    try:
+        presented = base64.b64decode(hmac_header)
+    except Exception:
+        return False
+    return hmac.compare_digest(presented, digest)
+
+
+async def _process_inventory_webhook(inventory_item_id, available_hint) -> None:
+    """
+    Background worker for inventory-level webhooks: resolve the inventory
+    item against Shopify and run the damaged-book rules. Errors are logged —
+    Shopify has already been acknowledged by the time this runs.
+    """
+    try:
+        resolved = await shopify_client.resolve_inventory_item(inventory_item_id)
+        if not resolved:
+            logger.info(f"[Webhook] no variant/product found for inventory_item_id={inventory_item_id}")
+            return
+
+        await used_book_manager.process_inventory_change(
+            inventory_item_id=str(inventory_item_id),
+            variant_id=resolved["variant_id"],
+            product=resolved["product"],
+            available_hint=available_hint,
+        )
+    except Exception as e:
+        logger.error(f"Error processing inventory update: {str(e)}")
+        # Shopify was already acknowledged, so this change is otherwise lost
+        # until the next scheduled tick — pull the reconcile forward and let
+        # it repair the row instead.
+        cron_service.request_reconcile()
 
 
 @router.post("/webhooks/inventory-levels")
-async def handle_inventory_webhook(request: Request):
+async def handle_inventory_webhook(request: Request, background_tasks: BackgroundTasks):
     # 1) Read raw body and verify HMAC
     raw_body = await request.body()
     hmac_header = request.headers.get("X-Shopify-Hmac-Sha256")
     if not hmac_header:
         raise HTTPException(status_code=400, detail="Missing HMAC header")
 
-    shopify_secret = settings.SHOPIFY_WEBHOOK_SECRET   # was settings.SHOPIFY_API_SECRET
-    if not shopify_secret:
+    if not _WEBHOOK_SECRET_BYTES:
         raise HTTPException(status_code=500, detail="Missing server secret for webhook validation")
 
-    if not verify_shopify_hmac(hmac_header, raw_body, shopify_secret):
+    if not verify_shopify_hmac(hmac_header, raw_body):
         raise HTTPException(status_code=401, detail="Invalid HMAC signature")
 
-    # 2) Parse JSON
+    # 2) Parse JSON from the bytes we already read for HMAC verification —
+    #    request.json() would buffer and decode the body a second time.
     try:
-        data = await request.json()
-    except Exception:
+        data = orjson.loads(raw_body)
+    except orjson.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid JSON body")
 
     inventory_item_id = data.get("inventory_item_id")
@@ -67,25 +101,10 @@ async def handle_inventory_webhook(request: Request):
     # Optional hint we forward to the manager (helps short‑circuit logic)
     available_hint = data.get("available")
 
-    try:
-        resolved = await shopify_client.resolve_inventory_item(inventory_item_id)
-        if not resolved:
-            return JSONResponse(
-                status_code=200,
-                content={"status": "no-op", "reason": f"no variant/product found for inventory_item_id={inventory_item_id}"}
-            )
-
-        result = await used_book_manager.process_inventory_change(
-            inventory_item_id=str(inventory_item_id),
-            variant_id=resolved["variant_id"],
-            product=resolved["product"],
-            available_hint=available_hint,
-        )
-
-    except Exception as e:
-        logger.error(f"Error processing inventory update: {str(e)}")
-        # 200 avoids Shopify retries on app errors
-        return JSONResponse(status_code=200, content={"status": "error", "detail": str(e)})
+    # 3) Acknowledge immediately; Shopify's webhook timeout is tight, and the
+    #    Shopify lookups + rule application can take multiple seconds.
+    background_tasks.add_task(_process_inventory_webhook, inventory_item_id, available_hint)
+    return JSONResponse(status_code=200, content={"status": "queued"})
 
 @router.post("/api/products/check")
 async def check_product(req: ProductCheckRequest):
@@ -153,8 +172,6 @@ async def get_product(product_id: str):
 @router.put("/api/products/{product_id}/publish")
 async def publish_product(product_id: str):
     try:
-        from services.product_service import set_product_publish_status
-
         await set_product_publish_status(product_id, publish=True)
         return {
             "success": True,
@@ -169,8 +186,6 @@ async def publish_product(product_id: str):
 @router.put("/api/products/{product_id}/unpublish")
 async def unpublish_product(product_id: str):
     try:
-        from services.product_service import set_product_publish_status
-
         await set_product_publish_status(product_id, publish=False)
         return {
             "success": True,
@@ -184,9 +199,7 @@ async def unpublish_product(product_id: str):
 @router.post("/api/redirects")
 async def create_redirect(redirect_req: RedirectRequest):
     try:
-        from services.redirect_service import create_redirect
-
-        redirect = await create_redirect(redirect_req.from_path, redirect_req.to_path)
+        redirect = await redirect_service.create_redirect(redirect_req.from_path, redirect_req.to_path)
         if not redirect:
             raise Exception("Failed to create redirect")
 
@@ -203,9 +216,7 @@ async def create_redirect(redirect_req: RedirectRequest):
 @router.delete("/api/redirects/{redirect_id}")
 async def delete_redirect(redirect_id: str):
     try:
-        from services.redirect_service import delete_redirect
-
-        success = await delete_redirect(redirect_id)
+        success = await redirect_service.delete_redirect(redirect_id)
         if not success:
             raise Exception("Failed to delete redirect")
 
@@ -222,9 +233,7 @@ async def delete_redirect(redirect_id: str):
 @router.get("/api/redirects/{redirect_id}")
 async def get_redirect(redirect_id: str):
     try:
-        from services.redirect_service import get_redirect_by_id
-
-        redirect = await get_redirect_by_id(redirect_id)
+        redirect = await redirect_service.get_redirect_by_id(redirect_id)
         if not redirect:
             raise HTTPException(status_code=404, detail="Redirect not found")
 
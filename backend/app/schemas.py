@@ -1,7 +1,7 @@
 # backend/app/schemas.py
 
 from typing import Optional, List, Dict, Literal, Union
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 
 # ---------------------------------------------------------------------------
@@ -27,6 +27,10 @@ class CanonicalProductInfo(BaseModel):
 # ---------------------------------------------------------------------------
 
 class DuplicateCheckRequest(BaseModel):
+    # Bulk previews validate thousands of these per paste; skip instance
+    # revalidation and strip whitespace during the single validation pass.
+    model_config = ConfigDict(str_strip_whitespace=True, revalidate_instances="never")
+
     canonical_handle: str
 
 
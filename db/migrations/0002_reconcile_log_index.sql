@@ -0,0 +1,16 @@
+-- 0002_reconcile_log_index.sql
+-- Index reconcile_log for the "latest run" lookup used by /admin/reconcile/status.
+
+-- Table may predate migrations on older environments; create it idempotently.
+create table if not exists damaged.reconcile_log (
+  id bigserial primary key,
+  inspected integer not null default 0,
+  updated   integer not null default 0,
+  skipped   integer not null default 0,
+  note      text,
+  at        timestamptz not null default now()
+);
+
+-- The status endpoint always does ORDER BY at DESC LIMIT 1; without an index
+-- that is a full scan of an append-only table that grows every half hour.
+create index if not exists idx_dmg_reconcile_log_at_desc on damaged.reconcile_log (at desc);
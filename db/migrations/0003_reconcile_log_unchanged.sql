@@ -0,0 +1,6 @@
+-- 0003_reconcile_log_unchanged.sql
+-- Reconcile now skips rows whose Shopify state already matches the DB; record
+-- how many so the status endpoint can show steady-state runs as such.
+
+alter table damaged.reconcile_log
+  add column if not exists unchanged integer not null default 0;
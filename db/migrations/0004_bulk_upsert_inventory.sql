@@ -0,0 +1,63 @@
+-- 0004_bulk_upsert_inventory.sql
+-- Bulk counterpart to damaged_upsert_inventory: the reconcile batch arrives
+-- as one jsonb array and lands in a single INSERT ... ON CONFLICT, instead
+-- of one PostgREST upsert per page with client-side timestamps.
+
+-- These columns exist in production environments but predate the migration
+-- files; create them idempotently so the function below always compiles.
+alter table damaged.inventory add column if not exists condition_raw text;
+alter table damaged.inventory add column if not exists condition_key text;
+
+create or replace function damaged.damaged_bulk_upsert_inventory(
+  _rows   jsonb,
+  _source text default 'reconcile'
+) returns integer
+language plpgsql
+as $$
+declare
+  _n integer;
+begin
+  insert into damaged.inventory (
+    inventory_item_id, product_id, variant_id, handle, condition,
+    condition_raw, condition_key, available,
+    last_shopify_sync_at, last_webhook_at, last_source,
+    title, sku, barcode
+  )
+  select
+    t.inventory_item_id, t.product_id, t.variant_id, coalesce(t.handle, ''),
+    t.condition_key,  -- legacy column mirrors the normalized key
+    t.condition_raw, t.condition_key, coalesce(t.available, 0),
+    now(), now(), _source,
+    t.title, t.sku, t.barcode
+  from jsonb_to_recordset(_rows) as t(
+    inventory_item_id bigint,
+    product_id        bigint,
+    variant_id        bigint,
+    handle            text,
+    condition_raw     text,
+    condition_key     text,
+    available         integer,
+    title             text,
+    sku               text,
+    barcode           text
+  )
+  on conflict (inventory_item_id) do update
+  set
+    product_id           = excluded.product_id,
+    variant_id           = excluded.variant_id,
+    handle               = excluded.handle,
+    condition            = excluded.condition,
+    condition_raw        = excluded.condition_raw,
+    condition_key        = excluded.condition_key,
+    available            = excluded.available,
+    last_shopify_sync_at = case when excluded.last_source = 'reconcile' then now() else damaged.inventory.last_shopify_sync_at end,
+    last_webhook_at      = case when excluded.last_source = 'webhook'   then now() else damaged.inventory.last_webhook_at end,
+    last_source          = excluded.last_source,
+    title                = coalesce(excluded.title, damaged.inventory.title),
+    sku                  = coalesce(excluded.sku, damaged.inventory.sku),
+    barcode              = coalesce(excluded.barcode, damaged.inventory.barcode);
+
+  get diagnostics _n = row_count;
+  return _n;
+end;
+$$;
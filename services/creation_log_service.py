@@ -1,33 +1,85 @@
 # services/creation_log_service.py
 
+import asyncio
 from typing import Optional, List, Dict, Any
 import logging
 
-from services.supabase_client import get_client
+from pydantic import TypeAdapter
+
+from services.supabase_client import SUPABASE_SEM, get_client
 from backend.app.schemas import BulkCreateRequest, BulkCreateResult, CreatedVariantInfo
 
 logger = logging.getLogger(__name__)
 
+_VARIANTS_ADAPTER = TypeAdapter(List[CreatedVariantInfo])
+
+# Fire-and-forget audit writes. Tasks keep a strong reference here until done
+# so the event loop can't garbage-collect them mid-flight (same pattern as
+# cron_service._background); the app lifespan drains this set on shutdown.
+_background: set[asyncio.Task] = set()
+
+
+def _fire(coro) -> None:
+    t = asyncio.create_task(coro)
+    _background.add(t)
+    t.add_done_callback(_background.discard)
+
+
+async def drain_background() -> None:
+    """Wait out any in-flight audit writes; called from app shutdown."""
+    if _background:
+        await asyncio.gather(*_background, return_exceptions=True)
+
 
 def _serialize_variants(variants: List[CreatedVariantInfo]) -> list[dict[str, Any]]:
     """
-    Convert CreatedVariantInfo Pydantic models to a plain JSON-serializable list.
+    Convert CreatedVariantInfo Pydantic models to a plain JSON-serializable
+    list in one pydantic-core call (Rust) instead of per-field Python access.
+    """
+    return _VARIANTS_ADAPTER.dump_python(variants or [], mode="json")
+
+
+async def fetch_creation_log(limit: int = 100) -> List[Dict[str, Any]]:
     """
-    serialized: list[dict[str, Any]] = []
-    for v in variants or []:
-        serialized.append(
-            {
-                "condition": v.condition,
-                "variant_id": v.variant_id,
-                "quantity_set": v.quantity_set,
-                "price": v.price,
-                "sku": v.sku,
-                "barcode": v.barcode,
-                "inventory_management": v.inventory_management,
-                "inventory_policy": v.inventory_policy,
-            }
-        )
-    return serialized
+    Read the most recent creation_log rows for the Admin Dashboard.
+    """
+    builder = (
+        get_client()
+        .schema("damaged")
+        .from_("creation_log")
+        .select("*")
+        .order("created_at", desc=True)
+        .limit(limit)
+    )
+    # Sync PostgREST call — run it in a worker thread like the other reads.
+    async with SUPABASE_SEM:
+        res = await asyncio.to_thread(builder.execute)
+    return res.data or []
+
+
+def _event_payload(
+    request: BulkCreateRequest,
+    result: BulkCreateResult,
+    operator: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Build one creation_log row from a (request, result) pair.
+    """
+    message: Optional[str] = None
+    if result.messages:
+        # Join multiple messages into one text field for now
+        message = "; ".join([m for m in result.messages if m])
+
+    return {
+        "canonical_handle": request.canonical_handle,
+        "damaged_handle": result.damaged_handle,   # <-- corrected
+        "damaged_product_id": str(result.damaged_product_id) if result.damaged_product_id else None,
+        "variants_json": _serialize_variants(result.variants),
+        "operator": operator,
+        "dry_run": request.dry_run,
+        "status": result.status,
+        "message": message,
+    }
 
 
 async def log_creation_event(
@@ -40,39 +92,57 @@ async def log_creation_event(
 
     - Logs ALL runs (success, dry-run, error) per Option A.
     - Never raises; errors are logged and swallowed.
+    - The insert itself is fire-and-forget: the payload is built inline
+      (cheap, pure Python) and the Supabase round trip runs as a background
+      task so callers don't pay it on the request path.
     """
 
-    supabase = get_client()
-
     try:
-        variants_payload = _serialize_variants(result.variants)
-
-        message: Optional[str] = None
-        if result.messages:
-            # Join multiple messages into one text field for now
-            message = "; ".join([m for m in result.messages if m])
-
-        # --- inside log_creation_event() ---
-
-        payload = {
-            "canonical_handle": request.canonical_handle,
-            "damaged_handle": result.damaged_handle,   # <-- corrected
-            "damaged_product_id": str(result.damaged_product_id) if result.damaged_product_id else None,
-            "variants_json": variants_payload,
-            "operator": operator,
-            "dry_run": request.dry_run,
-            "status": result.status,
-            "message": message,
-        }
-
-        supabase.schema("damaged").from_("creation_log").insert(payload).execute()
-        logger.info(
-            "[CreationLog] wrote creation_log row canonical=%s damaged=%s status=%s",
-            request.canonical_handle,
-            payload["damaged_handle"],
-            result.status,
-        )
+        payload = _event_payload(request, result, operator)
+    except Exception as e:
+        logger.warning("[CreationLog] failed to build creation_log row: %s", e)
+        return
+
+    async def _write() -> None:
+        try:
+            supabase = get_client()
+            await asyncio.to_thread(
+                lambda: supabase.schema("damaged").from_("creation_log").insert(payload).execute()
+            )
+            logger.info(
+                "[CreationLog] wrote creation_log row canonical=%s damaged=%s status=%s",
+                request.canonical_handle,
+                payload["damaged_handle"],
+                result.status,
+            )
+        except Exception as e:
+            # Never break the main flow because of logging issues.
+            logger.warning("[CreationLog] failed to write creation_log row: %s", e)
+
+    _fire(_write())
+
 
+async def log_creation_events_bulk(
+    events: List[tuple],
+    operator: Optional[str] = None,
+) -> None:
+    """
+    Write many (request, result) audit rows in a single insert.
+
+    Used by the bulk confirm path so a batch of failures costs one Supabase
+    round trip instead of one per entry. Same best-effort contract as
+    log_creation_event: never raises.
+    """
+    if not events:
+        return
+
+    try:
+        rows = [_event_payload(req, res, operator) for req, res in events]
+        builder = get_client().schema("damaged").from_("creation_log").insert(rows)
+        # Blocking insert goes to a worker thread so the bulk-confirm
+        # response isn't frozen behind the Supabase round trip.
+        async with SUPABASE_SEM:
+            await asyncio.to_thread(builder.execute)
+        logger.info("[CreationLog] wrote %s creation_log rows in one insert", len(rows))
     except Exception as e:
-        # Never break the main flow because of logging issues.
-        logger.warning("[CreationLog] failed to write creation_log row: %s", e)
\ No newline at end of file
+        logger.warning("[CreationLog] failed to write %s creation_log rows: %s", len(events), e)
\ No newline at end of file
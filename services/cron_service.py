@@ -3,117 +3,270 @@ from services.supabase_client import get_client
 from services.shopify_client import shopify_client  # Add this import or adjust as needed
 import logging
 import asyncio
-from services import damaged_inventory_repo, product_service, notification_service
+import time
+from functools import lru_cache
+from services import damaged_inventory_repo, product_service, notification_service, inventory_cache
 import os
 from services.used_book_manager import apply_product_rules_with_product
 from services import seo_service
-from services.inventory_service import resolve_by_inventory_item_id
+from services.inventory_service import resolve_by_inventory_item_id, resolve_many_by_inventory_item_ids
 
 logger = logging.getLogger(__name__)
-supabase = get_client()
 SHOPIFY_LOCATION_ID = os.getenv("SHOPIFY_LOCATION_ID")
 
+@lru_cache(maxsize=4096)
 def _to_gid(kind: str, v: str | int | None) -> str | None:
     if v is None:
         return None
     s = str(v)
     return s if s.startswith("gid://") else f"gid://shopify/{kind}/{s}"
 
+# The location never changes at runtime — normalize it to a GID once.
+_LOCATION_GID = _to_gid("Location", SHOPIFY_LOCATION_ID)
+
+# Products whose publish/redirect rules were applied recently. The diff-driven
+# upsert already keeps stable rows out of `touched`; this suppresses repeats
+# across back-to-back runs (e.g. webhook-triggered wake right after a cron
+# pass) where availability flapped but settled on the same state.
+_RULES_TTL_SECONDS = 600.0
+_rules_applied: dict[tuple[int, str], float] = {}
+
+
+async def _sb_exec(builder):
+    """Run a blocking PostgREST query in a worker thread so it doesn't stall the loop."""
+    return await asyncio.to_thread(builder.execute)
+
+
+# Fire-and-forget writes (reconcile_log). Tasks keep a strong reference here
+# until done so the event loop can't garbage-collect them mid-flight.
+_background: set[asyncio.Task] = set()
+
+
+def _fire(coro) -> None:
+    t = asyncio.create_task(coro)
+    _background.add(t)
+    t.add_done_callback(_background.discard)
+
+
+async def drain_background() -> None:
+    """Wait out any in-flight background writes; called from app shutdown."""
+    if _background:
+        await asyncio.gather(*_background, return_exceptions=True)
+
+def _build_upsert_row(r: dict, resp: dict) -> dict:
+    """Merge one inventory row with its pre-resolved Shopify data into an upsert payload."""
+    inv_id = int(r["inventory_item_id"])
+
+    available = resp.get("available")
+    if available is None:
+        available = r.get("available", 0)
+
+    variant = resp.get("variant", {})
+    sku = variant.get("sku")
+    barcode = variant.get("barcode")
+    opts = {o.get("name"): o.get("value") for o in (variant.get("selectedOptions") or [])}
+    condition_raw = opts.get("Condition")
+    condition_key = condition_raw.lower().replace(" ", "_") if condition_raw else None
+
+    logger.info(
+        "Upserting inventory item %s with condition=%s, condition_raw=%s, condition_key=%s, available=%s, sku=%s, barcode=%s",
+        inv_id, condition_raw, condition_raw, condition_key, available, sku, barcode,
+    )
+
+    return {
+        "inventory_item_id": inv_id,
+        "product_id": int(r["product_id"]),
+        "variant_id": int(r["variant_id"]),
+        "handle": r["handle"],
+        "condition_raw": condition_raw,
+        "condition_key": condition_key,
+        "available": int(available or 0),
+        "title": r.get("title"),
+        "sku": sku,
+        "barcode": barcode,
+    }
+
 async def reconcile_damaged_inventory(batch_limit: int = 200):
     inspected = 0
     updated = 0
     skipped = 0
+    unchanged = 0
 
     if not SHOPIFY_LOCATION_ID:
         return {"inspected": 0, "updated": 0, "skipped": 0, "note": "missing SHOPIFY_LOCATION_ID"}
 
-    # Normalize once
-    location_gid = _to_gid("Location", SHOPIFY_LOCATION_ID)
+    touched = set()
 
-    res = supabase.schema("damaged").from_("inventory").select(
-        "inventory_item_id, product_id, variant_id, handle, condition, condition_raw, condition_key, title, sku, barcode, available"
-    ).limit(batch_limit).execute()
-    rows = res.data or []   
+    # get_client() is memoized, so grabbing it here instead of at import
+    # keeps module import free of config/connection side effects.
+    supabase = get_client()
 
-    touched = set()
-    for r in rows:
-        inspected += 1
-        inv_id = int(r["inventory_item_id"])
-        product_id = int(r["product_id"])
-        handle = r["handle"]
-        try:
-            resp = await resolve_by_inventory_item_id(inv_id, location_gid)
-            available = resp.get("available")
-            if available is None:
-                available = r.get("available", 0)
-            sku = None
-            barcode = None
-            condition_raw = None
-            condition_key = None
-            condition = None
-
-            variant = resp.get("variant", {})
-            sku = variant.get("sku")
-            barcode = variant.get("barcode")
-            selected_options = variant.get("selectedOptions", [])
-            for option in selected_options:
-                if option.get("name") == "Condition":
-                    condition_raw = option.get("value")
-                    if condition_raw:
-                        condition_key = condition_raw.lower().replace(" ", "_")
-                    condition = condition_raw
-                    break
-
-            logger.info(f"Upserting inventory item {inv_id} with condition={condition_raw}, condition_raw={condition_raw}, condition_key={condition_key}, available={available}, sku={sku}, barcode={barcode}")
-
-            damaged_inventory_repo.upsert(
-                inventory_item_id=inv_id,
-                product_id=product_id,
-                variant_id=int(r["variant_id"]),
-                handle=handle,
-                condition=condition_raw,
-                condition_raw=condition_raw,
-                condition_key=condition_key,
-                available=int(available or 0),
-                source="reconcile",
-                title=r.get("title"),
-                sku=sku,
-                barcode=barcode,
-            )
-            touched.add((product_id, handle))
-            updated += 1
+    async def _fetch_page(cursor: int) -> list[dict]:
+        res = await _sb_exec(
+            # Identifiers plus exactly the columns the diff check compares
+            # against Shopify (available/sku/barcode/condition_key) and the
+            # title fallback; condition and condition_raw were dead weight.
+            supabase.schema("damaged").from_("inventory").select(
+                "inventory_item_id, product_id, variant_id, handle, condition_key, title, sku, barcode, available"
+            ).like("handle", "%-damaged").order("inventory_item_id").gt("inventory_item_id", cursor).limit(batch_limit)
+        )
+        return res.data or []
 
-        except Exception as e:
-            logger.info(f"[Reconcile] skip inventory_item_id={inv_id}: {e}")
-            skipped += 1
-    # Apply product-level rules once per damaged product we touched
-    for (pid, handle) in touched:
-        canonical = seo_service.resolve_canonical_handle(handle)
+    async def _upsert_page(batch: list[dict], batch_touched: set) -> None:
+        nonlocal updated, skipped
+        # One round trip for the whole page instead of one RPC per row.
         try:
-            await apply_product_rules_with_product(str(pid), handle, canonical)
+            await asyncio.to_thread(damaged_inventory_repo.bulk_upsert, batch, source="reconcile")
+            updated += len(batch)
+            touched.update(batch_touched)
         except Exception as e:
-            logger.warning(f"Failed to apply product rules for {handle}: {e}")
+            logger.warning(f"[Reconcile] bulk upsert failed: {e}")
+            skipped += len(batch)
+
+    # Keyset pagination over the primary key: walk the whole table in
+    # batch_limit pages instead of reconciling only the first 200 rows.
+    # Ordering by inventory_item_id keeps the cursor stable mid-walk. The
+    # stages are pipelined at page granularity: while page N resolves
+    # against Shopify, page N+1's DB read and page N-1's bulk upsert are
+    # both in flight, so wall time tracks the slowest stage rather than
+    # the sum of the three.
+    upsert_task: asyncio.Task | None = None
+    next_page = asyncio.create_task(_fetch_page(0))
+    while True:
+        rows = await next_page
+        if not rows:
+            break
+        if len(rows) == batch_limit:
+            next_page = asyncio.create_task(_fetch_page(int(rows[-1]["inventory_item_id"])))
+        else:
+            next_page = None
+
+        # Rows the webhook stream confirmed within the last two minutes and
+        # that already match the DB need no Shopify call at all; a fresh
+        # value that *disagrees* with the DB falls through to resolution.
+        stale_rows = []
+        for r in rows:
+            fresh = inventory_cache.get_fresh(int(r["inventory_item_id"]))
+            if fresh is not None and fresh == int(r.get("available") or 0):
+                inspected += 1
+                unchanged += 1
+                continue
+            stale_rows.append(r)
+
+        # One aliased GraphQL document per 50 rows replaces the per-row
+        # inventoryItem query — a 200-row page is 4 round trips.
+        resolved = await resolve_many_by_inventory_item_ids(
+            [int(r["inventory_item_id"]) for r in stale_rows], _LOCATION_GID
+        )
 
-    note = "missing SHOPIFY_LOCATION_ID" if not SHOPIFY_LOCATION_ID else None
+        to_upsert = []
+        page_touched = set()
+        unresolved = 0
+        for r in stale_rows:
+            inspected += 1
+            # Dict-level miss check instead of raising/catching per row;
+            # misses (e.g. deleted variants) are summarized once per page.
+            resp = resolved.get(int(r["inventory_item_id"]))
+            if resp is None:
+                unresolved += 1
+                skipped += 1
+                continue
+            row = _build_upsert_row(r, resp)
+            # Diff-driven write: on a stable inventory most rows already
+            # match, and skipping them turns the cron into ~zero writes.
+            old = (int(r.get("available") or 0), r.get("sku"), r.get("barcode"), r.get("condition_key"))
+            new = (row["available"], row["sku"], row["barcode"], row["condition_key"])
+            if new == old:
+                unchanged += 1
+                continue
+            to_upsert.append(row)
+            page_touched.add((int(r["product_id"]), r["handle"]))
+        if unresolved:
+            logger.info("[Reconcile] %s of %s rows had no Shopify data this page", unresolved, len(stale_rows))
 
-    try:
-        supabase.schema("damaged").from_("reconcile_log").insert({
-            "inspected": inspected,
-            "updated": updated,
-            "skipped": skipped,
-            "note": note,
-        }).execute()
-    except Exception as e:
-        logger.warning(f"Failed to persist reconcile log: {e}")
+        # Drain the previous page's write before scheduling this one so at
+        # most one upsert is outstanding (keeps counters ordered too).
+        if upsert_task is not None:
+            await upsert_task
+        upsert_task = asyncio.create_task(_upsert_page(to_upsert, page_touched)) if to_upsert else None
+
+        if next_page is None:
+            break
+    if upsert_task is not None:
+        await upsert_task
+    # Apply product-level rules once per damaged product we touched, with
+    # bounded concurrency — each call may hit Shopify several times, and a
+    # failure for one product must not kill the others.
+    rules_sem = asyncio.Semaphore(8)
+    now = time.monotonic()
+    for key in [k for k, ts in _rules_applied.items() if now - ts > 2 * _RULES_TTL_SECONDS]:
+        del _rules_applied[key]
+
+    async def _apply(pid: int, handle: str) -> None:
+        ts = _rules_applied.get((pid, handle))
+        if ts is not None and now - ts < _RULES_TTL_SECONDS:
+            return
+        async with rules_sem:
+            try:
+                canonical = await seo_service.resolve_canonical_handle(handle)
+                # Explicit deadline: a hung Shopify call must not pin a
+                # semaphore slot and stall the rest of the gather.
+                await asyncio.wait_for(
+                    apply_product_rules_with_product(str(pid), handle, canonical),
+                    timeout=30.0,
+                )
+                _rules_applied[(pid, handle)] = time.monotonic()
+            except asyncio.TimeoutError:
+                logger.warning("Product rules timed out for %s", handle)
+            except Exception as e:
+                logger.warning(f"Failed to apply product rules for {handle}: {e}")
+
+    await asyncio.gather(*[_apply(pid, handle) for (pid, handle) in touched])
+
+    # The missing-location case already returned above, so no note applies here.
+    note = None
+
+    # Nothing downstream reads the log row, so don't hold the response on it.
+    async def _write_log() -> None:
+        try:
+            await _sb_exec(
+                supabase.schema("damaged").from_("reconcile_log").insert({
+                    "inspected": inspected,
+                    "updated": updated,
+                    "skipped": skipped,
+                    "unchanged": unchanged,
+                    "note": note,
+                })
+            )
+        except Exception as e:
+            logger.warning(f"Failed to persist reconcile log: {e}")
+
+    _fire(_write_log())
 
     return {
         "inspected": inspected,
         "updated": updated,
         "skipped": skipped,
+        "unchanged": unchanged,
         "note": note
-    }                           
+    }
+
+# Set by webhook handlers (via request_reconcile) to pull the next reconcile
+# forward instead of waiting out the full interval.
+_reconcile_wake = asyncio.Event()
+
+
+def request_reconcile() -> None:
+    """Ask the background loop to reconcile now rather than at the next tick."""
+    _reconcile_wake.set()
+
 
 async def run_forever(interval_seconds: int = 1800):
     while True:
         await reconcile_damaged_inventory()
-        await asyncio.sleep(interval_seconds)
\ No newline at end of file
+        try:
+            await asyncio.wait_for(_reconcile_wake.wait(), timeout=interval_seconds)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            _reconcile_wake.clear()
\ No newline at end of file
@@ -1,9 +1,9 @@
 # services/damaged_inventory_repo.py
-from services.supabase_client import get_client
+import asyncio
 
-supabase = get_client()
+from services.supabase_client import get_client
 
-def upsert(
+async def upsert(
     inventory_item_id: int,
     product_id: int,
     variant_id: int,
@@ -17,7 +17,10 @@ def upsert(
     sku: str | None = None,
     barcode: str | None = None,
 ):
-    return supabase.schema("damaged").rpc(
+    # The sync PostgREST call runs in a worker thread so the webhook
+    # handler's event loop keeps servicing other requests meanwhile.
+    # get_client() is memoized — fetching it per call avoids import-time I/O.
+    builder = get_client().schema("damaged").rpc(
         "damaged_upsert_inventory",
         {
             "_inventory_item_id": inventory_item_id,
@@ -33,10 +36,64 @@ def upsert(
             "_sku": sku,
             "_barcode": barcode,
         },
-    ).execute()
+    )
+    return await asyncio.to_thread(builder.execute)
+
+def bulk_upsert(rows: list[dict], source: str = "reconcile"):
+    """
+    Upsert many inventory rows in ONE RPC instead of one call per row. Each
+    dict carries the same fields upsert() takes (inventory_item_id,
+    product_id, variant_id, handle, condition_raw, condition_key, available,
+    title, sku, barcode).
+
+    damaged_bulk_upsert_inventory (migration 0004) unpacks the jsonb array
+    server-side with jsonb_to_recordset, so the batch is a single INSERT ...
+    ON CONFLICT statement and the source-dependent timestamps
+    (last_shopify_sync_at vs last_webhook_at) are applied in SQL, same as
+    the per-row RPC does.
+    """
+    if not rows:
+        return None
+
+    payload = []
+    for r in rows:
+        payload.append(
+            {
+                "inventory_item_id": int(r["inventory_item_id"]),
+                "product_id": int(r["product_id"]),
+                "variant_id": int(r["variant_id"]),
+                "handle": r.get("handle") or "",
+                "condition_raw": r.get("condition_raw"),
+                "condition_key": r.get("condition_key"),
+                "available": int(r.get("available") or 0),
+                "title": r.get("title"),
+                "sku": r.get("sku"),
+                "barcode": r.get("barcode"),
+            }
+        )
+
+    return (
+        get_client().schema("damaged")
+        .rpc("damaged_bulk_upsert_inventory", {"_rows": payload, "_source": source})
+        .execute()
+    )
+
 
-def list_view(limit: int = 200, in_stock: bool | None = None):
-    q = supabase.schema("damaged").from_("inventory_view").select("*").limit(limit)
+def list_view(limit: int = 200, in_stock: bool | None = None, after: int | None = None):
+    # Keyset pagination on the primary key: `after` is the last
+    # inventory_item_id of the previous page. Ordering is required for the
+    # cursor to be stable.
+    # count="exact" has Postgres report the total matching rows alongside
+    # the limit-sized page, so callers don't conflate page size with total.
+    q = (
+        get_client().schema("damaged")
+        .from_("inventory_view")
+        .select("*", count="exact")
+        .order("inventory_item_id")
+        .limit(limit)
+    )
+    if after is not None:
+        q = q.gt("inventory_item_id", after)
     if in_stock is True:
         q = q.gt("available", 0)
     elif in_stock is False:
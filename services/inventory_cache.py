@@ -0,0 +1,36 @@
+# services/inventory_cache.py
+"""
+Process-local cache of `available` quantities recently seen on webhooks.
+
+The webhook pipeline already carries the authoritative quantity for an
+inventory item; the reconcile cron consults this cache before resolving a
+row against Shopify, so rows the webhooks just confirmed cost zero GraphQL
+calls. Entries go stale after a couple of minutes — reconcile exists to
+catch exactly the items webhooks missed.
+"""
+import time
+
+_TTL_SECONDS = 120.0
+_MAX_ENTRIES = 10000
+
+_cache: dict[int, tuple[int, float]] = {}
+
+
+def set_available(inventory_item_id: int, available: int) -> None:
+    """Record the quantity a webhook just reported for this item."""
+    _cache[int(inventory_item_id)] = (int(available), time.monotonic())
+    if len(_cache) > _MAX_ENTRIES:
+        cutoff = time.monotonic() - 2 * _TTL_SECONDS
+        for k in [k for k, (_, ts) in _cache.items() if ts < cutoff]:
+            del _cache[k]
+
+
+def get_fresh(inventory_item_id: int, max_age: float = _TTL_SECONDS) -> int | None:
+    """Return the cached quantity if it is younger than max_age, else None."""
+    entry = _cache.get(int(inventory_item_id))
+    if entry is None:
+        return None
+    available, ts = entry
+    if time.monotonic() - ts > max_age:
+        return None
+    return available
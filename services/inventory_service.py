@@ -1,7 +1,13 @@
 # /services/inventory_service.py
 
+import asyncio
 import logging
+import time
 from typing import Optional
+
+import httpx
+import orjson
+
 from services.shopify_client import shopify_client
 
 logger = logging.getLogger(__name__)
@@ -20,30 +26,33 @@ def _extract_condition_from_variant(variant: dict) -> Optional[str]:
       2. Fallback to option1/2/3 if they contain 'damage'.
       3. Fallback to variant title if it looks like a condition string.
     """
-    try:
-        # Admin GraphQL returns selectedOptions [{name, value}]
-        for opt in (variant.get("selectedOptions") or []):
-            name = (opt.get("name") or "").strip().lower()
+    # Pure string ops on already-parsed dicts — nothing here can raise, so
+    # the old broad try/except was just frame overhead on every resolve.
+    # Admin GraphQL returns selectedOptions [{name, value}]; when it's
+    # present the REST-era option1/2/3 keys never coexist, so a non-empty
+    # list is authoritative and the fallbacks below can be skipped.
+    sel = variant.get("selectedOptions")
+    if sel:
+        for opt in sel:
+            name = (opt.get("name") or "").strip().casefold()
             val = (opt.get("value") or "").strip()
             if name == "condition" or "damage" in name:
                 return val
             # In some stores, option might be named differently but value has damage keyword
-            if "damage" in val.lower():
+            if "damage" in val.casefold():
                 return val
+        return None
 
-        # Fallback for older stores using option1/2/3
-        for k in ("option1", "option2", "option3"):
-            v = variant.get(k)
-            if isinstance(v, str) and "damage" in v.lower():
-                return v
+    # Fallback for older stores using option1/2/3
+    for k in ("option1", "option2", "option3"):
+        v = variant.get(k)
+        if isinstance(v, str) and "damage" in v.casefold():
+            return v
 
-        # Fallback to variant title if it contains damage info
-        title = variant.get("title")
-        if isinstance(title, str) and "damage" in title.lower():
-            return title
-
-    except Exception as e:
-        logger.warning(f"[InventoryService] Failed to extract condition: {e}. Variant={variant}")
+    # Fallback to variant title if it contains damage info
+    title = variant.get("title")
+    if isinstance(title, str) and "damage" in title.casefold():
+        return title
 
     return None
 
@@ -81,24 +90,9 @@ async def is_variant_in_stock(variant_id: str, inventory_item_id: str, *, availa
 
 # ---------------------------------------------------------------
 # Additional resolver for inventory_item_id to variant/product info
-async def resolve_by_inventory_item_id(inventory_item_id: int, location_gid: str) -> dict:
-    """
-    Resolve Shopify variant/product info from an inventory_item_id and return:
-      {
-        "available": int,
-        "inventory_item_id": int,
-        "variant": {
-           "id": str_gid, "sku": str|None, "barcode": str|None,
-           "title": str|None,
-           "selectedOptions": [{"name","value"}, ...],
-           "condition": "Light Damage" | "Moderate Damage" | "Heavy Damage" | None,
-           "condition_raw": str|None,
-           "condition_key": str|None
-        },
-        "product": { "id": str_gid, "handle": str, "title": str }
-      }
-    """
-    gql = """
+
+# Built once at import; the document never varies between calls.
+_RESOLVE_BY_INVENTORY_ITEM_QUERY = """
     query VariantByInventoryItem($inventoryItemId: ID!) {
       inventoryItem(id: $inventoryItemId) {
         variant {
@@ -109,11 +103,9 @@ async def resolve_by_inventory_item_id(inventory_item_id: int, location_gid: str
           selectedOptions { name value }
           product { id handle title }
         }
-        inventoryLevels(first: 5) {
+        inventoryLevels(first: 1) {
           edges {
             node {
-              id
-              location { id }
               quantities(names: ["available"]) {
                 name
                 quantity
@@ -124,11 +116,62 @@ async def resolve_by_inventory_item_id(inventory_item_id: int, location_gid: str
       }
     }
     """
+
+
+# Short-TTL single-flight cache for resolver lookups. Shopify often delivers
+# several webhooks for the same inventory item within seconds (quantity set,
+# then adjust); storing the in-flight task (not just the result) coalesces
+# concurrent callers onto one GraphQL query — same pattern as the duplicate
+# check cache in product_service.
+_RESOLVE_TTL_SECONDS = 15.0
+_resolve_cache: dict[tuple[int, str | None], tuple[float, asyncio.Task]] = {}
+
+
+async def resolve_by_inventory_item_id(inventory_item_id: int, location_gid: str) -> dict:
+    """
+    Cached front-end for _resolve_by_inventory_item_id. Repeat webhook bursts
+    for the same item within the TTL share one Shopify round trip.
+    """
+    key = (int(inventory_item_id), location_gid)
+    now = time.monotonic()
+
+    cached = _resolve_cache.get(key)
+    if cached and cached[0] > now and not (cached[1].done() and cached[1].exception()):
+        return await cached[1]
+
+    task = asyncio.ensure_future(
+        _resolve_by_inventory_item_id(inventory_item_id, location_gid)
+    )
+    _resolve_cache[key] = (now + _RESOLVE_TTL_SECONDS, task)
+    try:
+        return await task
+    except Exception:
+        _resolve_cache.pop(key, None)
+        raise
+
+
+async def _resolve_by_inventory_item_id(inventory_item_id: int, location_gid: str) -> dict:
+    """
+    Resolve Shopify variant/product info from an inventory_item_id and return:
+      {
+        "available": int,
+        "inventory_item_id": int,
+        "variant": {
+           "id": str_gid, "sku": str|None, "barcode": str|None,
+           "title": str|None,
+           "selectedOptions": [{"name","value"}, ...],
+           "condition": "Light Damage" | "Moderate Damage" | "Heavy Damage" | None,
+           "condition_raw": str|None,
+           "condition_key": str|None
+        },
+        "product": { "id": str_gid, "handle": str, "title": str }
+      }
+    """
     inventory_item_gid = f"gid://shopify/InventoryItem/{inventory_item_id}"
     variables = {
         "inventoryItemId": inventory_item_gid,
     }
-    resp = await shopify_client.graphql(gql, variables)
+    resp = await shopify_client.graphql(_RESOLVE_BY_INVENTORY_ITEM_QUERY, variables)
 
     # Handle both possible shapes of resp:
     # 1. resp = {"body": {"data": {...}}}
@@ -144,14 +187,23 @@ async def resolve_by_inventory_item_id(inventory_item_id: int, location_gid: str
     if inv_item is None:
         logger.warning(f"[InventoryService] inventoryItem is None for GID={inventory_item_gid}. Possible bad GID or data issue.")
         logger.warning(f"[InventoryService] Full GraphQL response: {resp}")
+
+    return _shape_resolved_item(inventory_item_id, inv_item)
+
+
+def _shape_resolved_item(inventory_item_id: int | str, inv_item: dict | None) -> dict:
+    """
+    Shape one GraphQL inventoryItem node into the resolver's return dict.
+    Shared by the single and batched resolvers.
+    """
+    if inv_item is None:
         variant = {}
     else:
         variant = inv_item.get("variant") or {}
         if variant == {}:
-            logger.info(f"[InventoryService] Empty variant returned. Raw GraphQL body: {body}")
-    data = {"inventoryItem": inv_item} if inv_item is not None else {}
+            logger.debug("[InventoryService] Empty variant returned. Raw node: %s", inv_item)
 
-    edges = (data.get("inventoryItem", {}).get("inventoryLevels", {}).get("edges") or [])
+    edges = ((inv_item or {}).get("inventoryLevels", {}).get("edges") or [])
     available = 0
     if edges:
         quantities = edges[0]["node"].get("quantities", [])
@@ -159,7 +211,9 @@ async def resolve_by_inventory_item_id(inventory_item_id: int, location_gid: str
             if q.get("name") == "available":
                 available = coerce_quantity(q.get("quantity", 0))
                 break
-    logger.info(f"[InventoryService] Raw variant payload: {variant}")
+    # Full payload dump only when DEBUG is on — this stringifies the whole
+    # variant on every webhook otherwise.
+    logger.debug("[InventoryService] Raw variant payload: %s", variant)
     product = (variant.get("product") or {})
     condition = _extract_condition_from_variant(variant)
     variant["condition"] = condition
@@ -176,7 +230,12 @@ async def resolve_by_inventory_item_id(inventory_item_id: int, location_gid: str
     variant["condition_raw"] = condition_raw
     variant["condition_key"] = condition_key
 
-    logger.info(f"[InventoryService] Mapped condition_raw='{condition_raw}', condition_key='{condition_key}' for variant id={variant.get('id')}")
+    logger.info(
+        "[InventoryService] Mapped condition_raw='%s', condition_key='%s' for variant id=%s",
+        condition_raw,
+        condition_key,
+        variant.get("id"),
+    )
 
     try:
         inventory_item_id_int = int(inventory_item_id)
@@ -187,4 +246,195 @@ async def resolve_by_inventory_item_id(inventory_item_id: int, location_gid: str
         "inventory_item_id": inventory_item_id_int,
         "variant": variant,
         "product": product,
-    }
\ No newline at end of file
+    }
+
+
+# Static document for the batched resolver: nodes() takes the whole id list
+# as one variable, unlike the per-id aliases it replaced.
+_RESOLVE_MANY_QUERY = """
+    query ResolveInventoryItems($ids: [ID!]!) {
+      nodes(ids: $ids) {
+        ... on InventoryItem {
+          id
+          variant {
+            id
+            sku
+            barcode
+            title
+            selectedOptions { name value }
+            product { id handle title }
+          }
+          inventoryLevels(first: 1) {
+            edges {
+              node {
+                quantities(names: ["available"]) { name quantity }
+              }
+            }
+          }
+        }
+      }
+    }
+    """
+
+
+async def resolve_many_by_inventory_item_ids(
+    inventory_item_ids: list[int],
+    location_gid: str | None = None,
+    chunk_size: int = 50,
+) -> dict[int, dict]:
+    """
+    Batched resolve_by_inventory_item_id: one nodes(ids: [...]) document
+    resolves a whole chunk, so reconciling N rows costs ceil(N / chunk_size)
+    round trips instead of N — and a single static query instead of a
+    per-chunk generated alias list.
+
+    Returns {inventory_item_id: payload} with the same per-entry shape as
+    resolve_by_inventory_item_id. Ids Shopify doesn't know (or whose variant
+    is gone) are OMITTED, so callers can treat a missing key as "no Shopify
+    data" and skip the row instead of upserting an empty shell.
+    """
+    results: dict[int, dict] = {}
+    # De-duplicate while keeping order: repeated ids would each occupy a
+    # slot in the document (and Shopify query budget) for the same answer.
+    ids = list(dict.fromkeys(int(i) for i in inventory_item_ids))
+
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        variables = {"ids": [f"gid://shopify/InventoryItem/{inv_id}" for inv_id in chunk]}
+
+        resp = await shopify_client.graphql(_RESOLVE_MANY_QUERY, variables)
+        body = resp
+        if isinstance(resp, dict) and isinstance(resp.get("body"), dict):
+            body = resp["body"]
+        data = (body.get("data") or {}) if isinstance(body, dict) else {}
+        nodes = data.get("nodes") or []
+
+        # nodes() preserves input order and yields null for unknown ids;
+        # those (and items whose variant was deleted) stay out of the map.
+        for inv_id, node in zip(chunk, nodes):
+            if node and node.get("variant"):
+                results[inv_id] = _shape_resolved_item(inv_id, node)
+
+    return results
+
+# ---------------------------------------------------------------
+# Full-catalog export via Shopify bulk operations
+
+# Bulk queries run on Shopify's side outside the leaky bucket, so a
+# full-store variant dump doesn't compete with webhook traffic for quota.
+_BULK_EXPORT_QUERY = """
+{
+  productVariants {
+    edges {
+      node {
+        id
+        sku
+        barcode
+        title
+        inventoryQuantity
+        selectedOptions { name value }
+        inventoryItem { id }
+        product { id handle title }
+      }
+    }
+  }
+}
+"""
+
+_BULK_EXPORT_MUTATION = """
+    mutation BulkExportInventory($query: String!) {
+      bulkOperationRunQuery(query: $query) {
+        bulkOperation { id status }
+        userErrors { field message }
+      }
+    }
+    """
+
+_CURRENT_BULK_OP_QUERY = """
+    query {
+      currentBulkOperation {
+        id
+        status
+        errorCode
+        objectCount
+        url
+      }
+    }
+    """
+
+
+def _graphql_data(resp) -> dict:
+    """Unwrap the two response shapes shopify_client.graphql can return."""
+    body = resp
+    if isinstance(resp, dict) and isinstance(resp.get("body"), dict):
+        body = resp["body"]
+    return (body.get("data") or {}) if isinstance(body, dict) else {}
+
+
+async def bulk_export_inventory(
+    poll_interval: float = 5.0,
+    timeout: float = 600.0,
+) -> dict[int, dict]:
+    """
+    Export every damaged-book variant through bulkOperationRunQuery and
+    return {inventory_item_id: payload} in the resolver's shape.
+
+    Submits the bulk query, polls currentBulkOperation until it completes,
+    then streams the result JSONL line by line — the full catalog never
+    sits in memory at once. Intended for full-store backfills where paging
+    the synchronous API would grind against the rate limit.
+    """
+    resp = await shopify_client.graphql(_BULK_EXPORT_MUTATION, {"query": _BULK_EXPORT_QUERY})
+    run = _graphql_data(resp).get("bulkOperationRunQuery") or {}
+    errors = run.get("userErrors") or []
+    if errors:
+        raise RuntimeError(f"bulkOperationRunQuery rejected: {errors}")
+
+    url = None
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status_resp = await shopify_client.graphql(_CURRENT_BULK_OP_QUERY, {})
+        op = _graphql_data(status_resp).get("currentBulkOperation") or {}
+        status = op.get("status")
+        if status == "COMPLETED":
+            url = op.get("url")
+            break
+        if status in ("FAILED", "CANCELED", "EXPIRED"):
+            raise RuntimeError(f"bulk operation {op.get('id')} ended {status}: {op.get('errorCode')}")
+        await asyncio.sleep(poll_interval)
+    else:
+        raise TimeoutError(f"bulk operation did not complete within {timeout}s")
+
+    results: dict[int, dict] = {}
+    if not url:  # zero matching objects — Shopify returns no result file
+        return results
+
+    # The result URL is a pre-signed download; no Shopify auth involved.
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        async with client.stream("GET", url) as download:
+            download.raise_for_status()
+            async for line in download.aiter_lines():
+                if not line:
+                    continue
+                node = orjson.loads(line)
+                product = node.get("product") or {}
+                if not (product.get("handle") or "").lower().endswith("-damaged"):
+                    continue
+                inv_gid = (node.get("inventoryItem") or {}).get("id") or ""
+                try:
+                    inv_id = int(inv_gid.rsplit("/", 1)[-1])
+                except ValueError:
+                    continue
+                variant = {
+                    "id": node.get("id"),
+                    "sku": node.get("sku"),
+                    "barcode": node.get("barcode"),
+                    "title": node.get("title"),
+                    "selectedOptions": node.get("selectedOptions") or [],
+                    "product": product,
+                }
+                shaped = _shape_resolved_item(inv_id, {"variant": variant, "inventoryLevels": {"edges": []}})
+                # Bulk export carries the store-wide quantity directly.
+                shaped["available"] = coerce_quantity(node.get("inventoryQuantity"))
+                results[inv_id] = shaped
+    return results
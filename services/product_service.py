@@ -1,11 +1,15 @@
 # services/product_service.py
 
+import asyncio
 import logging
 import os
+import re
+import time
 from collections import defaultdict
-from datetime import datetime
+from datetime import datetime, timezone
+from functools import lru_cache
 from services.shopify_client import shopify_client
-from services.supabase_client import get_client
+from services.supabase_client import SUPABASE_SEM, get_client
 from backend.app.schemas import (
     BulkCreateRequest,
     BulkCreateResult,
@@ -14,10 +18,15 @@ from backend.app.schemas import (
     InventorySeed,
     BulkCreateInput,
 )
-from services.creation_log_service import log_creation_event
+from services.creation_log_service import log_creation_event, log_creation_events_bulk
 
 logger = logging.getLogger(__name__)
 
+# Compiled once — these run on hot webhook/creation paths.
+_TITLE_SPLIT_RE = re.compile(r"[:;–—-]")
+_DAMAGED_HANDLE_RE = re.compile(r"^(?P<base>.+)-(?:hurt|used|damaged|damage)-(light|moderate|mod|heavy)$")
+_DAMAGED_HANDLE_SUFFIX_RE = re.compile(r"^(?P<base>.+)-(light|moderate|mod|heavy)-damage$")
+
 # Shopify location used when setting damaged inventory levels.
 # Preferred: DBS_SHOPIFY_LOCATION_ID (service-specific); fallback: SHOPIFY_LOCATION_ID.
 _SHOPIFY_LOCATION_ID_RAW = os.getenv("DBS_SHOPIFY_LOCATION_ID") or os.getenv("SHOPIFY_LOCATION_ID")
@@ -30,6 +39,10 @@ except ValueError:
         _SHOPIFY_LOCATION_ID_RAW,
     )
 
+# Cap concurrent canonical creations during bulk confirm. Each creation is a
+# chain of Shopify calls, so keep this well under the Admin API rate limit.
+_BULK_CREATE_SEM = asyncio.Semaphore(int(os.getenv("BULK_CREATE_CONCURRENCY", "5")))
+
 # Manual collection that all in-stock damaged products should belong to.
 DAMAGED_BOOKS_COLLECTION_GID = "gid://shopify/Collection/279535911045"
 
@@ -993,6 +1006,8 @@ async def _update_existing_damaged_inventory(
         except Exception as e:
             logger.warning("[Taxonomy] Failed to set category on existing product %s: %s", damaged_id, e)
 
+    _invalidate_duplicate_check(canonical_handle)
+
     return BulkCreateResult(
         status="updated",
         damaged_product_id=damaged_id,
@@ -1064,20 +1079,22 @@ async def create_damaged_from_preview_items(
     # ------------------------------------------------------------------
     # 2. Process each canonical — create fresh or update existing
     # ------------------------------------------------------------------
+    # Canonicals are independent, so process them concurrently under the
+    # module-level semaphore instead of one-at-a-time.
     all_results: list[dict] = []
     errors: list[dict] = []
 
-    for cid, group in grouped.items():
+    async def _process_one(group: dict) -> dict:
         canonical_handle: str = group["canonical_handle"]
         inventory: dict = group["inventory"]
         damaged_handle = f"{canonical_handle}-damaged"
 
-        logger.info(
-            "[BulkConfirm] Processing canonical_handle=%s inventory=%s",
-            canonical_handle, inventory,
-        )
+        async with _BULK_CREATE_SEM:
+            logger.info(
+                "[BulkConfirm] Processing canonical_handle=%s inventory=%s",
+                canonical_handle, inventory,
+            )
 
-        try:
             # Check whether the damaged product already exists
             dup_result = await check_damaged_duplicate(
                 canonical_handle=canonical_handle,
@@ -1095,23 +1112,55 @@ async def create_damaged_from_preview_items(
             else:
                 # CREATE PATH — new damaged product
                 logger.info("[BulkConfirm] Damaged product not found → creating fresh for %s", canonical_handle)
+                # The confirm items were already validated by FastAPI at the
+                # route boundary — model_construct skips re-validating here.
                 variants = [
-                    VariantSeed(condition=cond, quantity=qty, price_override=None)
+                    VariantSeed.model_construct(condition=cond, quantity=qty, price_override=None)
                     for cond, qty in inventory.items()
                 ]
-                data = BulkCreateRequest(
+                data = BulkCreateRequest.model_construct(
                     canonical_handle=canonical_handle,
                     variants=variants,
                     dry_run=False,
                 )
-                result = await create_damaged_product_with_duplicate_check(data)
+                result = await create_damaged_product_with_duplicate_check(data, precheck=dup_result)
 
-            serialized = result.model_dump() if hasattr(result, "model_dump") else result
-            all_results.append(serialized)
+            return result.model_dump() if hasattr(result, "model_dump") else result
 
-        except Exception as e:
-            logger.exception("[BulkConfirm] Failed for canonical_handle=%s", canonical_handle)
-            errors.append({"canonical_handle": canonical_handle, "error": str(e)})
+    groups = list(grouped.values())
+    outcomes = await asyncio.gather(
+        *[_process_one(g) for g in groups],
+        return_exceptions=True,
+    )
+
+    error_events: list[tuple] = []
+    for group, outcome in zip(groups, outcomes):
+        if isinstance(outcome, Exception):
+            canonical_handle = group["canonical_handle"]
+            logger.error(
+                "[BulkConfirm] Failed for canonical_handle=%s: %s",
+                canonical_handle, outcome,
+            )
+            errors.append({"canonical_handle": canonical_handle, "error": str(outcome)})
+            error_events.append(
+                (
+                    BulkCreateRequest.model_construct(
+                        canonical_handle=canonical_handle, variants=[], dry_run=False
+                    ),
+                    BulkCreateResult(
+                        status="error",
+                        damaged_product_id=None,
+                        damaged_handle=f"{canonical_handle}-damaged",
+                        variants=[],
+                        messages=[str(outcome)],
+                    ),
+                )
+            )
+        else:
+            all_results.append(outcome)
+
+    # One insert for the whole batch of failures instead of a round trip each.
+    await log_creation_events_bulk(error_events)
 
     return {
         "ok": len(errors) == 0,
@@ -1177,9 +1226,182 @@ async def find_existing_by_handle(handle: str) -> dict | None:
         return None
 
 
+# Short-TTL single-flight cache for duplicate checks. The wizard typically
+# re-checks the same handle within seconds (preview → confirm → create), and
+# each check is a chain of Shopify + Supabase reads. Storing the in-flight
+# task (not just the result) coalesces concurrent callers onto one lookup.
+_DUP_CHECK_TTL_SECONDS = 30.0
+_dup_check_cache: dict[tuple[str, str | None], tuple[float, asyncio.Task]] = {}
+
+
+def _invalidate_duplicate_check(canonical_handle: str) -> None:
+    """Drop cached duplicate checks for a canonical after we create/update."""
+    for key in [k for k in _dup_check_cache if k[0] == canonical_handle]:
+        _dup_check_cache.pop(key, None)
+
+
 async def check_damaged_duplicate(
     canonical_handle: str,
     damaged_handle: str | None = None,
+) -> dict:
+    """
+    Cached front-end for _check_damaged_duplicate. Repeat calls for the same
+    handle within the TTL reuse the same lookup instead of re-hitting
+    Shopify/Supabase.
+    """
+    key = (canonical_handle, damaged_handle)
+    now = time.monotonic()
+
+    cached = _dup_check_cache.get(key)
+    if cached and cached[0] > now and not (cached[1].done() and cached[1].exception()):
+        return await cached[1]
+
+    task = asyncio.ensure_future(
+        _check_damaged_duplicate(canonical_handle, damaged_handle)
+    )
+    _dup_check_cache[key] = (now + _DUP_CHECK_TTL_SECONDS, task)
+    try:
+        return await task
+    except Exception:
+        _dup_check_cache.pop(key, None)
+        raise
+
+
+_PRODUCTS_BY_HANDLE_QUERY = """
+query ProductsByHandleSearch($q: String!, $first: Int!) {
+  products(first: $first, query: $q) {
+    edges {
+      node {
+        id
+        legacyResourceId
+        handle
+        title
+        status
+      }
+    }
+  }
+}
+"""
+
+
+async def check_damaged_duplicate_bulk(canonical_handles: list[str]) -> dict[str, dict]:
+    """
+    Batched duplicate check for the wizard preflight: Shopify searches
+    chunked over the canonical handles and ONE Supabase query for all
+    inventory rows, resolved per handle in Python.
+
+    Returns {canonical_handle: result} keyed by the handles as passed in,
+    with the same result shape as check_damaged_duplicate. existing_products
+    entries are the slimmer GraphQL nodes rather than full REST products —
+    the preview endpoint only reads handle/title/status from them.
+    """
+    base_by_input: dict[str, str] = {}
+    for h in canonical_handles:
+        base = (h or "").strip().lower()
+        if base:
+            base_by_input[h] = base
+    if not base_by_input:
+        return {}
+
+    bases = list(dict.fromkeys(base_by_input.values()))
+    damaged_by_base = {b: f"{b}-damaged" for b in bases}
+
+    # 1. Shopify searches over the handles, chunked like
+    #    resolve_many_by_inventory_item_ids chunks ids. Prefix wildcards let
+    #    each query cover the "-1"/"-2" suffix fallbacks
+    #    find_existing_by_handle probes one by one — which also means each
+    #    base can consume several of the 250 result slots (canonical,
+    #    -damaged, suffix probes, plus unrelated handles the wildcard sweeps
+    #    in), so large batches must not share a single search: results would
+    #    silently truncate and the missing canonicals would surface as false
+    #    conflicts.
+    found_by_handle: dict[str, dict] = {}
+    search_chunk_size = 40
+    for start in range(0, len(bases), search_chunk_size):
+        chunk = bases[start:start + search_chunk_size]
+        search = " OR ".join(f"handle:{h}*" for h in chunk)
+        try:
+            body = await shopify_client.graph(_PRODUCTS_BY_HANDLE_QUERY, {"q": search, "first": 250})
+            payload = body.get("body", body) if isinstance(body, dict) else {}
+            edges = (((payload.get("data") or {}).get("products") or {}).get("edges") or [])
+            for edge in edges:
+                node = edge.get("node") or {}
+                h = (node.get("handle") or "").strip().lower()
+                if h:
+                    found_by_handle[h] = node
+        except Exception as e:
+            logger.warning(
+                "[DuplicateCheck:bulk] Shopify search failed for %s handles: %s", len(chunk), e
+            )
+
+    def _match(base: str) -> dict | None:
+        # Same candidates find_existing_by_handle probes, resolved locally.
+        for cand in (base, f"{base}-1", f"{base}-2", f"{base}-3"):
+            if cand in found_by_handle:
+                return found_by_handle[cand]
+        return None
+
+    # 2. One Supabase round trip for every damaged root at once.
+    inv_rows: list[dict] = []
+    try:
+        supabase = get_client()
+        ors = ",".join(f"handle.ilike.%{d}%" for d in damaged_by_base.values())
+
+        def _inventory_query():
+            return (
+                supabase.schema("damaged")
+                .table("inventory_view")
+                .select("*")
+                .or_(ors)
+                .execute()
+            )
+
+        async with SUPABASE_SEM:
+            rows = await asyncio.to_thread(_inventory_query)
+        inv_rows = rows.data or []
+    except Exception as e:
+        logger.warning("[DuplicateCheck:bulk] Supabase error: %s", e)
+
+    # 3. Pure-Python resolution per entry.
+    results: dict[str, dict] = {}
+    for original, base in base_by_input.items():
+        damaged = damaged_by_base[base]
+        found_canonical = _match(base)
+        found_damaged = found_by_handle.get(damaged)
+        entry_rows = [r for r in inv_rows if damaged in (r.get("handle") or "").strip().lower()]
+
+        result = {
+            "status": "ok",
+            "canonical_handle": original,
+            "damaged_handle": damaged,
+            "conflicts": {
+                "canonical_missing": found_canonical is None,
+                "damaged_exists": found_damaged is not None,
+                "inventory_present": bool(entry_rows),
+            },
+            "existing_products": {
+                "canonical": found_canonical,
+                "damaged": found_damaged,
+            },
+            "inventory_rows": entry_rows,
+            "safe_to_create": True,
+        }
+        if found_canonical is None:
+            result["status"] = "conflict"
+            result["safe_to_create"] = False
+        results[original] = result
+
+    logger.info(
+        "[DuplicateCheck:bulk] resolved %s handles in %s Shopify + 1 Supabase round trips",
+        len(results),
+        -(-len(bases) // search_chunk_size),
+    )
+    return results
+
+
+async def _check_damaged_duplicate(
+    canonical_handle: str,
+    damaged_handle: str | None = None,
 ) -> dict:
     """
     Duplicate/conflict check.
@@ -1240,13 +1462,20 @@ async def check_damaged_duplicate(
         # 3. SUPABASE INVENTORY CHECK
         try:
             supabase = get_client()
-            rows = (
-                supabase.schema("damaged")
-                .table("inventory_view")
-                .select("*")
-                .ilike("handle", f"%{base_damaged}%")
-                .execute()
-            )
+
+            def _inventory_query():
+                return (
+                    supabase.schema("damaged")
+                    .table("inventory_view")
+                    .select("*")
+                    .ilike("handle", f"%{base_damaged}%")
+                    .execute()
+                )
+
+            # Sync supabase client — run it in a worker thread so concurrent
+            # duplicate checks don't serialize on the event loop.
+            async with SUPABASE_SEM:
+                rows = await asyncio.to_thread(_inventory_query)
             inv = rows.data or []
             result["inventory_rows"] = inv
 
@@ -1281,9 +1510,14 @@ async def check_damaged_duplicate(
 
 async def create_damaged_product_with_duplicate_check(
     data: BulkCreateRequest,
+    precheck: dict | None = None,
 ) -> BulkCreateResult:
     """
     Duplicate-check → optional dry-run → create damaged product → return BulkCreateResult.
+
+    `precheck` lets callers that already ran check_damaged_duplicate (the
+    bulk confirm path) pass its result in rather than paying the Shopify +
+    Supabase lookups a second time.
     """
 
     if data.inputs:
@@ -1303,10 +1537,12 @@ async def create_damaged_product_with_duplicate_check(
 
     auto_damaged_handle = f"{data.canonical_handle.strip().lower()}-damaged"
 
-    dup_result = await check_damaged_duplicate(
-        canonical_handle=data.canonical_handle,
-        damaged_handle=auto_damaged_handle,
-    )
+    dup_result = precheck
+    if dup_result is None:
+        dup_result = await check_damaged_duplicate(
+            canonical_handle=data.canonical_handle,
+            damaged_handle=auto_damaged_handle,
+        )
 
     if not dup_result.get("safe_to_create", False):
         logger.warning("[BulkCreate] Conflict detected for %s", auto_damaged_handle)
@@ -1425,6 +1661,9 @@ async def create_damaged_product_with_duplicate_check(
     except Exception as e:
         logger.warning("[CreationLog] Failed to write create log: %s", e)
 
+    # The damaged product now exists — stale "safe to create" answers must go.
+    _invalidate_duplicate_check(data.canonical_handle)
+
     return result
 
 
@@ -1509,8 +1748,6 @@ async def create_damaged_pair(
       - Inventory_policy: 'deny' (no overselling of damaged books)
     """
 
-    import re
-
     # 1. Fetch canonical product
     canonical = await find_existing_by_handle(canonical_handle)
     if not canonical:
@@ -1519,7 +1756,7 @@ async def create_damaged_pair(
     canonical_title = (canonical.get("title") or "").strip()
 
     # 2. Derive damaged title & handle
-    m = re.split(r"[:;–—-]", canonical_title, maxsplit=1)
+    m = _TITLE_SPLIT_RE.split(canonical_title, maxsplit=1)
     base_title = m[0].strip()
     auto_damaged_title = f"{base_title}: Damaged"
     auto_damaged_handle = f"{canonical_handle.strip().lower()}-damaged"
@@ -1692,7 +1929,7 @@ async def get_product_by_id(product_id: str) -> dict:
 
 async def set_product_publish_status(product_id: str, should_publish: bool) -> dict:
     try:
-        published_at = datetime.utcnow().isoformat() if should_publish else None
+        published_at = datetime.now(timezone.utc).isoformat(timespec="seconds") if should_publish else None
         path = f"products/{product_id}.json"
         payload = {
             "product": {
@@ -1714,21 +1951,31 @@ async def set_product_publish_status(product_id: str, should_publish: bool) -> d
 
 def parse_damaged_handle(handle: str) -> tuple[str, str]:
     logger.warning("parse_damaged_handle is deprecated.")
-    import re
     h = (handle or "").lower()
-    m = re.match(r"^(?P<base>.+)-(?:hurt|used|damaged|damage)-(light|moderate|mod|heavy)$", h)
+    m = _DAMAGED_HANDLE_RE.match(h)
     if m:
         return m.group("base"), m.group(2)
-    m = re.match(r"^(?P<base>.+)-(light|moderate|mod|heavy)-damage$", h)
+    m = _DAMAGED_HANDLE_SUFFIX_RE.match(h)
     if m:
         return m.group("base"), m.group(2)
     return handle, None
 
+# Every suffix parse_damaged_handle accepts, flattened for endswith — a
+# C-level tuple suffix check beats running the regexes when only a yes/no
+# answer is needed.
+_USED_SUFFIXES = tuple(
+    f"-{m}-{g}"
+    for m in ("hurt", "used", "damage", "damaged")
+    for g in ("light", "moderate", "mod", "heavy")
+) + tuple(f"-{g}-damage" for g in ("light", "moderate", "mod", "heavy"))
+
 def is_used_book_handle(handle: str) -> bool:
     logger.warning("is_used_book_handle is deprecated.")
-    base, condition = parse_damaged_handle(handle)
-    return condition is not None
+    return bool(handle) and handle.lower().endswith(_USED_SUFFIXES)
 
+# Pure string → string; webhook storms hit it with the same handles over
+# and over, so repeat calls become a hash lookup (maxsize bounds memory).
+@lru_cache(maxsize=4096)
 def get_new_book_handle_from_used(used_handle: str) -> str:
     logger.warning("get_new_book_handle_from_used is deprecated.")
     base, condition = parse_damaged_handle(used_handle)
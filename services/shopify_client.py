@@ -1,12 +1,13 @@
 import os
+import random
 import time
-import json
 import logging
 import hmac
 import hashlib
 import base64
 from typing import Optional, Dict, Any
 import httpx
+import orjson
 import asyncio
 from urllib.parse import urlencode
 from config import get_settings
@@ -21,16 +22,75 @@ API_VERSION = settings.SHOPIFY_API_VERSION
 # NOT the app Client secret — it signs store-owned webhooks, is independent of
 # any app, and is unaffected by the app migration. Used only for HMAC checks.
 SHOPIFY_WEBHOOK_SECRET = settings.SHOPIFY_WEBHOOK_SECRET
+# Pre-encode once: verify_webhook runs on every webhook delivery.
+_WEBHOOK_SECRET_BYTES = SHOPIFY_WEBHOOK_SECRET.encode("utf-8") if SHOPIFY_WEBHOOK_SECRET else b""
 
 BASE_URL = f"https://{SHOP_URL}/admin/api/{API_VERSION}"
 
 if not SHOP_URL:
     raise ValueError("Missing required Shopify config: SHOP_URL")
 
+class _TokenBucket:
+    """
+    Client-side leaky-bucket guard for GraphQL calls. REST responses report
+    their bucket state in headers (see _note_call_limit below), but GraphQL
+    costs only arrive after the fact — so a local bucket smooths reconcile
+    bursts before Shopify has to throttle them. aiolimiter isn't a dependency
+    here; the refill arithmetic is a dozen lines.
+    """
+
+    def __init__(self, rate: float = 20.0, capacity: float = 40.0):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, cost: float = 1.0) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            if self._tokens >= cost:
+                self._tokens -= cost
+                return
+            wait = (cost - self._tokens) / self._rate
+            self._tokens = 0.0
+            self._updated = now + wait
+        await asyncio.sleep(wait)
+
+
 class ShopifyClient:
     def __init__(self):
         self.base_url = f"https://{SHOP_URL}/admin/api/{API_VERSION}"
         self._tokens = get_token_manager()
+        self._client: Optional[httpx.AsyncClient] = None
+        # Last-seen REST leaky-bucket state (assume empty until a response).
+        self._bucket_used = 0
+        self._bucket_cap = 40
+        # Rate guard for GraphQL, which has no pre-flight header to read.
+        self._gql_bucket = _TokenBucket()
+
+    def _http(self) -> httpx.AsyncClient:
+        """
+        Shared AsyncClient with a keepalive pool. Building a client per call
+        pays a fresh TCP+TLS handshake on every Shopify request; reusing one
+        pool amortizes that across webhooks, admin routes, and cron runs.
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                # HTTP/2 multiplexes concurrent Shopify calls (bulk preview,
+                # reconcile fan-out) over one TLS connection.
+                http2=True,
+                timeout=10.0,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        """Close the pooled client (called from the FastAPI lifespan)."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
 
     async def _auth_headers(self) -> dict:
         """Headers carrying a freshly-resolved client-credentials access token."""
@@ -75,18 +135,21 @@ class ShopifyClient:
         """
         url = f"{self.base_url}/graphql.json"
         payload = {"query": query, "variables": variables}
-        async with httpx.AsyncClient() as client:
-            for attempt in range(2):
-                headers = await self._auth_headers()
-                resp = await client.post(url, headers=headers, json=payload, timeout=10.0)
-                logger.info(f"[Shopify GQL] POST {url} -> {resp.status_code}")
-                if resp.status_code == 401 and attempt == 0:
-                    logger.warning("[Shopify GQL] 401; refreshing token and retrying once.")
-                    self._tokens.invalidate()
-                    await self._tokens.get_token(force_refresh=True)
-                    continue
-                resp.raise_for_status()
-                return resp.json()
+        client = self._http()
+        await self._gql_bucket.acquire()
+        for attempt in range(2):
+            headers = await self._auth_headers()
+            resp = await client.post(url, headers=headers, json=payload, timeout=10.0)
+            logger.info(f"[Shopify GQL] POST {url} -> {resp.status_code}")
+            if resp.status_code == 401 and attempt == 0:
+                logger.warning("[Shopify GQL] 401; refreshing token and retrying once.")
+                self._tokens.invalidate()
+                await self._tokens.get_token(force_refresh=True)
+                continue
+            resp.raise_for_status()
+            # orjson parses the (often multi-KB) GraphQL body several times
+            # faster than the stdlib decoder behind resp.json().
+            return orjson.loads(resp.content)
 
     async def graphql(self, query: str, variables: dict) -> dict:
         return await self.graph(query, variables)
@@ -149,47 +212,77 @@ class ShopifyClient:
             url += f"?{urlencode(query)}"
         return url
 
+    def _note_call_limit(self, response: httpx.Response) -> None:
+        """Track the REST leaky bucket from X-Shopify-Shop-Api-Call-Limit ('32/40')."""
+        header = response.headers.get("X-Shopify-Shop-Api-Call-Limit")
+        if not header:
+            return
+        try:
+            used, cap = header.split("/")
+            self._bucket_used, self._bucket_cap = int(used), int(cap)
+        except ValueError:
+            pass
+
+    def _throttle_delay(self) -> float:
+        """
+        Seconds to wait before the next REST call. Zero while the bucket has
+        headroom; near the cap we pause just long enough for the ~2 req/s
+        leak to open room, instead of sleeping a fixed interval every call.
+        """
+        headroom = self._bucket_cap - self._bucket_used
+        if headroom > 2:
+            return 0.0
+        return (3 - headroom) / 2.0
+
     async def _request(self, method: str, path: str, data: Optional[dict] = None, query: Optional[dict] = None) -> dict:
         url = self._build_url(path, query)
-        async with httpx.AsyncClient() as client:
-            for attempt in range(3):  # max 3 retries
-                try:
-                    headers = await self._auth_headers()
-                    response = await client.request(
-                        method=method.upper(),
-                        url=url,
-                        headers=headers,
-                        json=data if method in ["POST", "PUT"] else None,
-                        timeout=10.0
-                    )
-
-                    logger.info(f"[Shopify] {method.upper()} {url} -> {response.status_code}")
-
-                    if response.status_code == 401:
-                        logger.warning("[Shopify] 401; refreshing token and retrying.")
-                        self._tokens.invalidate()
-                        await self._tokens.get_token(force_refresh=True)
-                        continue
-
-                    if response.status_code == 429:
-                        retry_after = int(response.headers.get("Retry-After", "1"))
-                        logger.warning(f"Rate limited. Retrying after {retry_after}s...")
-                        await asyncio.sleep(retry_after)
-                        continue
-
-                    response.raise_for_status()
-                    return {
-                        "status": response.status_code,
-                        "body": response.json(),
-                        "headers": dict(response.headers)
-                    }
-                except httpx.RequestError as e:
-                    logger.error(f"Request error: {e}")
-                except httpx.HTTPStatusError as e:
-                    logger.error(f"HTTP status error: {e.response.text}")
-                    raise
-
-            raise Exception("Exceeded retry attempts due to rate limiting or request failure")
+        client = self._http()
+        for attempt in range(3):  # max 3 retries
+            try:
+                delay = self._throttle_delay()
+                if delay:
+                    await asyncio.sleep(delay)
+
+                headers = await self._auth_headers()
+                response = await client.request(
+                    method=method.upper(),
+                    url=url,
+                    headers=headers,
+                    json=data if method in ["POST", "PUT"] else None,
+                    timeout=10.0
+                )
+
+                logger.info(f"[Shopify] {method.upper()} {url} -> {response.status_code}")
+                self._note_call_limit(response)
+
+                if response.status_code == 401:
+                    logger.warning("[Shopify] 401; refreshing token and retrying.")
+                    self._tokens.invalidate()
+                    await self._tokens.get_token(force_refresh=True)
+                    continue
+
+                if response.status_code == 429:
+                    # Exponential backoff on Retry-After with jitter so
+                    # concurrent callers don't retry in lockstep.
+                    retry_after = float(response.headers.get("Retry-After", "1"))
+                    wait = retry_after * (2 ** attempt) + random.uniform(0, 0.25)
+                    logger.warning(f"Rate limited. Retrying after {wait:.2f}s...")
+                    await asyncio.sleep(wait)
+                    continue
+
+                response.raise_for_status()
+                return {
+                    "status": response.status_code,
+                    "body": orjson.loads(response.content) if response.content else {},
+                    "headers": dict(response.headers)
+                }
+            except httpx.RequestError as e:
+                logger.error(f"Request error: {e}")
+            except httpx.HTTPStatusError as e:
+                logger.error(f"HTTP status error: {e.response.text}")
+                raise
+
+        raise Exception("Exceeded retry attempts due to rate limiting or request failure")
 
     async def get(self, path: str, **kwargs) -> dict:
         # accept either query=... or params=...
@@ -210,11 +303,7 @@ class ShopifyClient:
         return await self._request("DELETE", path)
 
     def verify_webhook(self, hmac_header: str, data: bytes) -> bool:
-        digest = hmac.new(
-            SHOPIFY_WEBHOOK_SECRET.encode("utf-8"),
-            msg=data,
-            digestmod=hashlib.sha256
-        ).digest()
+        digest = hmac.digest(_WEBHOOK_SECRET_BYTES, data, hashlib.sha256)
         computed_hmac = base64.b64encode(digest).decode()
         return hmac.compare_digest(computed_hmac, hmac_header)
     
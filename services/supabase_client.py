@@ -1,16 +1,48 @@
 # services/supabase_client.py
+import asyncio
 import os
-from supabase import create_client, Client
+from functools import lru_cache
+
+from supabase import AsyncClient, Client, create_async_client, create_client
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 
-if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
-    raise RuntimeError(
-        "Supabase not configured. Set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY env vars."
-    )
+# Cap concurrent Supabase calls from async contexts so bursty admin polling
+# queues here instead of exhausting the PostgREST connection pool.
+SUPABASE_SEM = asyncio.Semaphore(int(os.getenv("SUPABASE_CONCURRENCY", "15")))
 
-_supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
 
+@lru_cache(maxsize=1)
 def get_client() -> Client:
-    return _supabase
\ No newline at end of file
+    """
+    One client for the whole process — same memoization pattern as
+    config.get_settings(). supabase-py keeps an HTTP session under the
+    hood, so constructing per call would pay connection setup each time.
+    """
+    if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
+        raise RuntimeError(
+            "Supabase not configured. Set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY env vars."
+        )
+    return create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+
+
+_async_client: AsyncClient | None = None
+
+
+async def get_async_client() -> AsyncClient:
+    """
+    Async counterpart to get_client(), for call sites migrating off the
+    thread-bounced sync client. Awaiting .execute() on this client keeps
+    the query on the event loop instead of a threadpool worker. Created
+    lazily on first use (create_async_client is itself a coroutine, so
+    lru_cache doesn't fit here).
+    """
+    global _async_client
+    if _async_client is None:
+        if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
+            raise RuntimeError(
+                "Supabase not configured. Set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY env vars."
+            )
+        _async_client = await create_async_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+    return _async_client
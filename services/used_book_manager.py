@@ -1,9 +1,12 @@
 # services/used_book_manager.py
 
+import asyncio
 import logging
-from services import redirect_service, seo_service, inventory_service
+import re
+from services import redirect_service, seo_service, inventory_service, inventory_cache
 from services import notification_service
 from services.shopify_client import shopify_client
+from services.supabase_client import SUPABASE_SEM
 import os
 from typing import Optional
 from services.inventory_service import resolve_by_inventory_item_id, coerce_quantity
@@ -11,6 +14,8 @@ from services.inventory_service import resolve_by_inventory_item_id, coerce_quan
 logger = logging.getLogger(__name__)
 
 SHOPIFY_LOCATION_ID = os.getenv("SHOPIFY_LOCATION_ID")
+# Normalized once — the location doesn't change at runtime.
+_LOCATION_GID = f"gid://shopify/Location/{SHOPIFY_LOCATION_ID}" if SHOPIFY_LOCATION_ID else None
 
 async def apply_product_rules_with_product(product_id: str, damaged_handle: str, canonical_handle: str) -> None:
     """
@@ -21,7 +26,11 @@ async def apply_product_rules_with_product(product_id: str, damaged_handle: str,
     """
     try:
         from services import damaged_inventory_repo  # local import to avoid cycles
-        rows_resp = damaged_inventory_repo.list_view(limit=2000, in_stock=None)
+        # list_view uses the sync Supabase client — keep it off the event loop.
+        async with SUPABASE_SEM:
+            rows_resp = await asyncio.to_thread(
+                damaged_inventory_repo.list_view, limit=2000, in_stock=None
+            )
         rows = rows_resp.data or []
         product_rows = [r for r in rows if (r.get("handle") or "").lower() == damaged_handle.lower()]
         any_in_stock = any(coerce_quantity(r.get("available")) > 0 for r in product_rows)
@@ -73,6 +82,9 @@ async def process_inventory_change(inventory_item_id: str, variant_id: str, prod
         # Optional hint
         if available_hint is not None:
             logger.info(f"[Hint] available_hint={available_hint} for inventory_item_id={inventory_item_id}, variant_id={variant_id}, product_id={product_id}")
+            # Feed the reconcile-side cache so the cron can skip items the
+            # webhook stream just confirmed.
+            inventory_cache.set_available(int(inventory_item_id), coerce_quantity(available_hint))
 
         # Stock status (prefer hint if provided)
         if available_hint is not None:
@@ -90,10 +102,10 @@ async def process_inventory_change(inventory_item_id: str, variant_id: str, prod
         variant_data = None
         if SHOPIFY_LOCATION_ID:
             try:
-                res = await resolve_by_inventory_item_id(int(inventory_item_id), f"gid://shopify/Location/{SHOPIFY_LOCATION_ID}")
+                res = await resolve_by_inventory_item_id(int(inventory_item_id), _LOCATION_GID)
                 variant_data = res.get("variant") or {}
 
-                logger.info(f"[Inventory] variant_data: {variant_data}")
+                logger.debug("[Inventory] variant_data: %s", variant_data)
 
                 # Extract condition_raw and condition_key directly
                 selected_options = (
@@ -130,7 +142,7 @@ async def process_inventory_change(inventory_item_id: str, variant_id: str, prod
         )
 
         from services import damaged_inventory_repo
-        damaged_inventory_repo.upsert(
+        await damaged_inventory_repo.upsert(
             inventory_item_id=int(inventory_item_id),
             product_id=int(product_id),
             variant_id=int(variant_id),
@@ -164,28 +176,63 @@ async def process_inventory_change(inventory_item_id: str, variant_id: str, prod
         })
         raise
 
+# Matches the rel="next" entry of a Shopify Link header regardless of
+# parameter order, in one compiled scan instead of a chain of splits.
+_NEXT_PAGE_RE = re.compile(r'<[^>]*[?&]page_info=([^&>]+)[^>]*>;\s*rel="next"')
+
+
+def _parse_next_page_info(link_header: str) -> Optional[str]:
+    """Pull the next-page cursor out of a Shopify Link header, if present."""
+    m = _NEXT_PAGE_RE.search(link_header or "")
+    return m.group(1) if m else None
+
+
+async def iter_products_by_handle_suffix(suffix: str, page_size: int = 250, max_items: int | None = None):
+    """
+    Stream Shopify products whose handle ends with `suffix`.
+
+    Yields matching products as each products.json page arrives, so a full
+    catalog scan holds at most one page in memory and callers can stop early
+    (via max_items or by breaking) without fetching the remaining pages.
+    """
+    page_info = None
+    yielded = 0
+    while True:
+        query: dict = {"limit": page_size}
+        if page_info:
+            query["page_info"] = page_info
+        resp = await shopify_client.get("products.json", query=query)
+        body = resp.get("body", {}) or {}
+
+        for p in body.get("products", []) or []:
+            if (p.get("handle") or "").lower().endswith(suffix):
+                yield p
+                yielded += 1
+                if max_items is not None and yielded >= max_items:
+                    return
+
+        link_header = (resp.get("headers") or {}).get("link") or ""
+        page_info = _parse_next_page_info(link_header)
+        if not page_info:
+            return
+
+
 async def scan_all_used_books():
-    # Placeholder — real logic would pull all products via Shopify and process each
-    logging.info("Starting full used book inventory scan...")
-
-    # Example: fake batch of product IDs
-    dummy_products = [
-        {"product_id": "gid://shopify/Product/123", "variant_id": "456", "inventory_item_id": "789"},
-        # Add more...
-    ]
-
-    for entry in dummy_products:
-        # Instead of fetching product via shopify_client.get_product_by_id_gql,
-        # simulate a hydrated product dict with required fields
-        product = {
-            "id": entry["product_id"],
-            "handle": "example-damaged",
-            "title": "Example Damaged Book Title"
-        }
-        await process_inventory_change(
-            inventory_item_id=entry["inventory_item_id"],
-            variant_id=entry["variant_id"],
-            product=product,
-        )
+    logger.info("Starting full used book inventory scan...")
+
+    scanned = 0
+    async for product in iter_products_by_handle_suffix("-damaged"):
+        scanned += 1
+        for variant in product.get("variants", []) or []:
+            try:
+                await process_inventory_change(
+                    inventory_item_id=str(variant.get("inventory_item_id")),
+                    variant_id=str(variant.get("id")),
+                    product=product,
+                )
+            except Exception as e:
+                logger.warning(
+                    f"[Scan] failed for product {product.get('id')} variant {variant.get('id')}: {e}"
+                )
 
-    logging.info("Used book inventory scan completed.")
\ No newline at end of file
+    logger.info(f"Used book inventory scan completed. products={scanned}")
\ No newline at end of file
@@ -1,6 +1,17 @@
 import asyncio
-from services.cron_service import reconcile_damaged_inventory
+from services import cron_service
+
+
+async def _reconcile_and_drain():
+    result = await cron_service.reconcile_damaged_inventory()
+    # asyncio.run tears the loop down as soon as this returns, which would
+    # cancel the fire-and-forget reconcile_log write. The FastAPI lifespan
+    # drains _background for the in-app loop; this worker has no lifespan,
+    # so let the write land before the loop exits.
+    await cron_service.drain_background()
+    return result
+
 
 def run_reconcile():
-    result = asyncio.run(reconcile_damaged_inventory())
-    return result  # Just return the full dictionary
\ No newline at end of file
+    result = asyncio.run(_reconcile_and_drain())
+    return result  # Just return the full dictionary